@@ -89,7 +89,9 @@ class Alarm_Clock(Thread):
                     else:
                         # Ring the alarm
                         self.logger.debug("Ringing alarm")
-                        self.to_led_strip.put_nowait(["Alarm_Clock", "alarm " + str(self.alarm_duration)])
+                        # Pass along when the alarm started so the brightness matches the time even if it starts late
+                        alarm_start = int(self.next_alarm_start.timestamp())
+                        self.to_led_strip.put_nowait(["Alarm_Clock", "alarm {} {}".format(self.alarm_duration, alarm_start)])
                         self.snoozed_last_alarm = False
                         self.alarm_last_rang_on = today
                         self.alarm_is_ringing = True
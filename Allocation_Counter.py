@@ -0,0 +1,50 @@
+import tracemalloc
+
+# Measures the peak memory the interpreter allocates during each of a number of frames with
+# tracemalloc. A frame's peak is the most memory it had allocated at once on top of what was
+# allocated when it started, so temporary objects that are freed before the frame ends still show
+# up, but memory that's freed and allocated again within the frame only counts once. Only counts while
+# tracemalloc is tracing, which slows everything down. Other threads allocate too, so only trust it
+# when they're quiet
+class Allocation_Counter():
+    # ATTRIBUTES
+    # started (int): Bytes allocated at the start of the current frame, None if it isn't being counted
+    # frames (int): Number of frames counted since the last reset
+    # allocated (int): Sum of the peaks of those frames in bytes
+    # peak (int): Highest peak of one of those frames in bytes
+    # last (int): Peak of the last frame in bytes
+
+    # Constructor
+    def __init__(self):
+        self.started = None
+        self.last = 0
+        self.reset()
+
+    # Marks the start of a frame
+    def start(self):
+        if tracemalloc.is_tracing():
+            self.started = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        else:
+            self.started = None
+
+    # Marks the end of the frame that was started last
+    def stop(self):
+        if self.started is None:
+            return
+        self.last = max(tracemalloc.get_traced_memory()[1] - self.started, 0)
+        self.allocated += self.last
+        self.peak = max(self.peak, self.last)
+        self.frames += 1
+
+    # Returns the average peak in bytes of the frames since the last reset
+    def per_frame(self):
+        if self.frames == 0:
+            return 0
+        return self.allocated / self.frames
+
+    # Starts counting again
+    def reset(self):
+        self.frames = 0
+        self.allocated = 0
+        self.peak = 0
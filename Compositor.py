@@ -0,0 +1,187 @@
+import Modes
+from Frame_Buffer import Frame
+import numpy
+import time
+
+# A mode running on its own frame with its own timing. The frame covers the part of the canvas
+# from start to stop, and gets blended onto whatever is below it on the canvas
+class Layer():
+    # ATTRIBUTES
+    # name (string): Name that commands use to refer to the layer
+    # mode (Mode): The mode that renders the layer
+    # start (int): Index on the canvas of the first pixel the layer covers
+    # stop (int): Index on the canvas after the last pixel the layer covers, None for the end of the canvas
+    # blend (string): How the layer combines with the layers below it, one of blend_modes
+    # alpha (float): Opacity of the layer from 0 to 1 when blending with alpha
+    # frame (Frame): Frame that the mode renders into, None until the canvas size is known
+    # frames (generator): Generator for the current cycle of the mode
+    # deadline (float): Monotonic time that the layer's next frame is due, None if it's due now
+    blend_modes = ("replace", "add", "max", "alpha")
+    max_lag = .25 # seconds behind schedule before giving up on catching up
+    max_restarts = 100 # empty cycles in a row before waiting until the next frame to try again
+    
+    # Constructor - validate arguments, convert them to attributes, and exit
+    def __init__(self, name, mode, start=0, stop=None, blend="replace", alpha=1):
+        if blend not in self.blend_modes:
+            raise ValueError("Blend mode must be one of " + ", ".join(self.blend_modes))
+        if not 0 <= alpha <= 1:
+            raise ValueError("Alpha must be between 0 and 1 inclusive")
+        if start < 0 or (stop is not None and stop <= start):
+            raise ValueError("Layer needs to cover at least one LED")
+        self.name = name
+        self.mode = mode
+        self.start = start
+        self.stop = stop
+        self.blend = blend
+        self.alpha = alpha
+        self.frame = None
+        self.frames = None
+        self.deadline = None
+        
+    # Makes sure the frame matches the part of a canvas of n pixels that the layer covers
+    def resize(self, n):
+        stop = n if self.stop is None else min(self.stop, n)
+        length = max(stop - min(self.start, n), 0)
+        if self.frame is None or self.frame.n != length:
+            self.frame = Frame(length)
+            self.frames = None
+            
+    # Renders the next frame of the mode if it's due. Returns whether a frame was rendered
+    def advance(self, now):
+        if self.frame.n == 0 or (self.deadline is not None and now < self.deadline):
+            return False
+        for restarts in range(self.max_restarts):
+            # Start a new cycle when the last one is over
+            if self.frames is None:
+                self.frames = self.mode.cycle(self.frame)
+            try:
+                frame_time = next(self.frames)
+            except StopIteration:
+                self.frames = None
+                continue
+            # Schedule the next frame, starting over from now if the layer is too far behind
+            if self.deadline is None or now - self.deadline > self.max_lag:
+                self.deadline = now
+            self.deadline += frame_time
+            return True
+        return False
+        
+    # Stops the mode's current cycle, so the next frame starts a new one
+    def close(self):
+        if self.frames is not None:
+            self.frames.close()
+            self.frames = None
+        
+    # Blends the layer's frame onto the canvas. scratch is a uint8 array at least as big as the
+    # canvas and wide is a pair of uint16 arrays that size, used to avoid allocating while blending
+    def draw(self, canvas, scratch, wide):
+        if self.frame.n == 0:
+            return
+        below = canvas[self.start:self.start + self.frame.n]
+        above = self.frame.pixels
+        if self.blend == "replace":
+            below[:] = above
+        elif self.blend == "max":
+            numpy.maximum(below, above, out=below)
+        elif self.blend == "add":
+            # Add without overflowing by adding at most the headroom left below 255
+            headroom = scratch[:self.frame.n]
+            numpy.subtract(255, below, out=headroom)
+            numpy.minimum(headroom, above, out=headroom)
+            numpy.add(below, headroom, out=below)
+        else:
+            # Mix in 8 bit fixed point: below + (above - below) * alpha
+            blend_frames(below, above, self.alpha, below, wide[:, :self.frame.n])
+            
+            
+# Mode that runs several layers at once and blends them together onto the canvas, from the
+# bottom layer up. Each layer renders on its own schedule
+class Compositor(Modes.Mode):
+    # ATTRIBUTES NOT INHERITED
+    # layers (list of Layers): Layers from bottom to top
+    name = "layers"
+    render_ahead = False # layers render on their own schedules
+    arg_dict = {
+        "name, start, stop, blend, mode, mode args" : "Run a mode on LEDs start to stop (or \"end\") on top of the current pattern. " +
+                                                     "Blend is replace, add, max or an opacity from 0 to 1",
+        "name, off" : "Remove a layer",
+    }
+    idle_time = .1 # seconds to wait when no layer has a frame scheduled
+    
+    # Constructor. The mode given becomes the bottom layer, covering the whole canvas
+    def __init__(self, base_mode):
+        self.layers = [Layer("base", base_mode)]
+        self.scratch = None
+        self.wide = None
+        
+    def cycle(self, leds):
+        # Make sure the layers and blending buffers match the canvas
+        if self.scratch is None or len(self.scratch) != leds.n:
+            self.scratch = numpy.zeros((leds.n, 4), dtype=numpy.uint8)
+            self.wide = numpy.zeros((2, leds.n, 4), dtype=numpy.uint16)
+            
+        # Render every layer that's due, then blend them all onto the canvas
+        now = time.monotonic()
+        for layer in self.layers:
+            layer.resize(leds.n)
+            layer.advance(now)
+        leds.fill(0)
+        for layer in self.layers:
+            layer.draw(leds.pixels, self.scratch, self.wide)
+            
+        # Wait until the next layer is due
+        deadlines = [layer.deadline for layer in self.layers if layer.deadline is not None]
+        if len(deadlines) == 0:
+            yield self.idle_time
+        else:
+            yield max(min(deadlines) - time.monotonic(), 0)
+        
+    # Adds a layer on top, or replaces the layer with the same name in place
+    def set_layer(self, layer):
+        for index, existing in enumerate(self.layers):
+            if existing.name == layer.name:
+                existing.close()
+                self.layers[index] = layer
+                return
+        self.layers.append(layer)
+        
+    # Removes the layer with the name given. Returns whether there was one to remove
+    def remove_layer(self, name):
+        for index, existing in enumerate(self.layers):
+            if existing.name == name:
+                existing.close()
+                del self.layers[index]
+                return True
+        return False
+        
+    # Modifications apply to the top layer
+    def modify(self, args, count=1):
+        return self.layers[-1].mode.modify(args, count)
+        
+        
+# Takes the fields of a layer command after the name and returns the Layer they describe
+def parse_layer(args):
+    name = args[0]
+    start = int(args[1])
+    stop = None if args[2] == "end" else int(args[2])
+    # The blend is either the name of a blend mode or an opacity for alpha blending
+    if args[3] in Layer.blend_modes:
+        blend = args[3]
+        alpha = 1
+    else:
+        blend = "alpha"
+        alpha = float(args[3])
+    mode_class = Modes.get_class(args[4])
+    if mode_class is None:
+        raise ValueError("Invalid mode name")
+    return Layer(name, mode_class(args[5:]), start, stop, blend, alpha)
+    
+# Mixes two frames in 8 bit fixed point, writing first * (1 - weight) + second * weight into out.
+# wide is a pair of uint16 arrays the same shape as the frames, used to avoid allocating
+def blend_frames(first, second, weight, out, wide):
+    level = int(round(weight * 256))
+    numpy.multiply(first, 256 - level, out=wide[0], dtype=numpy.uint16)
+    numpy.multiply(second, level, out=wide[1], dtype=numpy.uint16)
+    numpy.add(wide[0], wide[1], out=wide[0])
+    numpy.right_shift(wide[0], 8, out=wide[0])
+    out[:] = wide[0]
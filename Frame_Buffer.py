@@ -0,0 +1,99 @@
+import numpy
+
+# Preallocated RGBW frame that modes render into. Modes write into the (n, 4) pixels
+# array with vectorized operations
+class Frame():
+    # ATTRIBUTES
+    # n (int): Number of pixels in the frame
+    # pixels (numpy array): (n, 4) uint8 array of RGBW values
+    # rgbw (numpy array): Scratch color for fill_rgbw(), so filling doesn't allocate a new color every frame
+    
+    # Constructor
+    def __init__(self, n):
+        self.n = n
+        self.pixels = numpy.zeros((n, 4), dtype=numpy.uint8)
+        self.rgbw = numpy.zeros(4, dtype=numpy.uint8)
+        
+    # Sets every pixel in the frame to the color given. Does not call show()
+    def fill(self, color):
+        self.pixels[:] = color
+        
+    # Sets every pixel in the frame to the r, g, b and w values given. Does not call show()
+    def fill_rgbw(self, r, g, b, w):
+        rgbw = self.rgbw
+        rgbw[0] = r
+        rgbw[1] = g
+        rgbw[2] = b
+        rgbw[3] = w
+        self.pixels[:] = rgbw
+        
+
+# Frame that's connected to an output driver. show() hands the frame to the driver at once
+class Frame_Buffer(Frame):
+    # ATTRIBUTES NOT INHERITED
+    # driver (Output_Driver): The driver that frames get transferred to
+    # shown (numpy array): Copy of the last frame that was transferred to the strip, None before the first one
+    # skipped (int): Number of calls to show() that were skipped because nothing changed
+    # refresh (function): The driver's hook for resending when nothing changed, None if it doesn't need to
+    # changed (numpy array): Which pixels changed since the last frame, a view of the middle of a
+    #     buffer with an unchanged pixel on either end so runs of changed pixels always have two edges
+    # boundaries (numpy array): Whether each pixel changed differently from the one before it, one
+    #     more than there are pixels since the last one compares the end of the buffer
+    max_ranges = 8 # changed ranges to update separately before updating everything in between at once
+    
+    # Constructor. Allocates the frame to match the strip length
+    def __init__(self, driver):
+        Frame.__init__(self, driver.n)
+        self.driver = driver
+        self.shown = None
+        self.differences = numpy.zeros((self.n, 4), dtype=bool)
+        padded = numpy.zeros(self.n + 2, dtype=bool)
+        self.changed = padded[1:-1]
+        self.after = padded[1:]
+        self.before = padded[:-1]
+        self.boundaries = numpy.zeros(self.n + 1, dtype=bool)
+        self.reversed_boundaries = self.boundaries[::-1]
+        self.skipped = 0
+        self.refresh = getattr(driver, "refresh", None)
+        
+    # Transfers the frame that was rendered into pixels to the strip and shows it
+    def show(self):
+        return self.transmit(self.pixels)
+        
+    # Transfers the pixels of a frame that changed since the last frame to the strip and shows it.
+    # Skips the transfer entirely if nothing changed, other than letting drivers that have to keep
+    # sending to stay connected resend. Returns whether the strip was written to
+    def transmit(self, frame):
+        # The first frame always gets written in full
+        if self.shown is None:
+            self.shown = frame.copy()
+            self.driver.update(frame, 0, self.n)
+            self.driver.send()
+            return True
+            
+        # Find the pixels that are different from the last frame that was shown
+        numpy.not_equal(frame, self.shown, out=self.differences)
+        changed = numpy.any(self.differences, axis=1, out=self.changed)
+        if not changed.any():
+            self.skipped += 1
+            if self.refresh is not None:
+                self.refresh()
+            return False
+            
+        # Only copy the ranges that changed
+        edges = self.changed_edges()
+        for index in range(0, len(edges), 2):
+            self.driver.update(frame, edges[index], edges[index + 1])
+        self.shown[:] = frame
+        self.driver.send()
+        return True
+        
+    # Returns a list of where every run of changed pixels starts and stops, in order. If there are
+    # more runs than max_ranges, returns where one range covering all of them starts and stops, since
+    # one big copy is cheaper than lots of small ones. Works in the buffers allocated up front, so the
+    # only thing allocated is the list
+    def changed_edges(self):
+        numpy.not_equal(self.after, self.before, out=self.boundaries)
+        if numpy.count_nonzero(self.boundaries) > 2 * self.max_ranges:
+            return [int(self.boundaries.argmax()), self.n - int(self.reversed_boundaries.argmax())]
+        return self.boundaries.nonzero()[0].tolist()
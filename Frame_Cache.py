@@ -0,0 +1,172 @@
+import Modes
+import numpy
+import hashlib
+import logging
+import struct
+import time
+import os
+
+# Cache files hold one recorded cycle of a mode. The header is followed by every frame as
+# (frame count, pixel count, 4) RGBW bytes, then the delay after every frame as float32 seconds
+magic = b"WSFC"
+version = 1
+header_format = "<4sHHII20s" # magic, version, reserved, frame count, pixel count, key
+header_size = struct.calcsize(header_format)
+cache_directory = os.path.join(os.path.dirname(os.path.realpath(__file__)), "frame_cache")
+
+# Mode that plays a cacheable mode from a recording of one of its cycles. The first cycle for a
+# set of parameters and strip length renders the mode normally and records it. After that, every
+# cycle memory maps the recording and copies its frames out, so the mode itself never runs
+#
+# With a clock, the recording is played by time instead of frame by frame. The frame shown is
+# whichever one the clock's time falls on when the recording is repeated back to back from time
+# 0, so every unit playing the same recording by the same clock shows the same frame
+class Cached_Mode(Modes.Mode):
+    # ATTRIBUTES NOT INHERITED
+    # mode (Mode): The mode that gets recorded
+    # clock (Sync_Clock): Clock to pick frames by, None to play every frame in turn
+    # recording (Recording): The recording being played, None until one matches the mode
+    # uncached_key (bytes): Key of the last cycle that couldn't be recorded, so it runs uncached instead of being recorded again
+    max_bytes = 64 * 1024 * 1024 # largest recording to keep, bigger cycles just run uncached
+
+    # Constructor
+    def __init__(self, mode, clock=None):
+        self.mode = mode
+        self.name = mode.name
+        self.clock = clock
+        self.recording = None
+        self.uncached_key = None
+        # Frames picked by time have to be rendered when they're shown
+        self.render_ahead = clock is None
+
+    def cycle(self, leds):
+        # Run the mode itself if its cycle couldn't be recorded last time
+        key = cache_key(self.mode, leds.n)
+        if key == self.uncached_key:
+            yield from self.mode.cycle(leds)
+            return
+        
+        # Look for a recording if the mode or strip changed since the last one
+        if self.recording is None or self.recording.key != key:
+            self.recording = load(self.mode.name, key)
+
+        # Record the cycle while showing it if there's no recording yet
+        if self.recording is None:
+            self.recording = yield from record(self.mode, leds, key, self.max_bytes)
+            if self.recording is None:
+                self.uncached_key = key
+            return
+
+        # Otherwise replay it
+        if self.clock is None or self.recording.period <= 0:
+            for frame, delay in zip(self.recording.frames, self.recording.delays.tolist()):
+                leds.pixels[:] = frame
+                yield delay
+            return
+        
+        # Or show the frame that the clock falls on until the next one starts, until the recording
+        # comes back around to the start
+        last_index = 0
+        while True:
+            position = self.clock.now() % self.recording.period
+            index = min(int(numpy.searchsorted(self.recording.ends, position, side="right")), len(self.recording.ends) - 1)
+            if index < last_index:
+                return
+            last_index = index
+            leds.pixels[:] = self.recording.frames[index]
+            yield max(self.recording.ends[index] - position, 0)
+
+    # Modifications apply to the mode being recorded. Its parameters change, so the next cycle
+    # looks for a different recording
+    def modify(self, args, count=1):
+        return self.mode.modify(args, count)
+
+
+# Frames and delays of one cycle of a mode, memory mapped from a cache file
+class Recording():
+    # ATTRIBUTES
+    # key (bytes): Key of the mode and strip length that the recording was made for
+    # frames (numpy array): (frame count, pixel count, 4) uint8 array of frames
+    # delays (numpy array): Seconds to wait after each frame
+    # ends (numpy array): Seconds from the start of the recording to the end of each frame
+    # period (float): Seconds the whole recording takes
+
+    # Constructor
+    def __init__(self, key, frames, delays):
+        self.key = key
+        self.frames = frames
+        self.delays = delays
+        self.ends = numpy.cumsum(delays, dtype=numpy.float64)
+        self.period = float(self.ends[-1])
+
+# Takes a mode and a strip length and returns a key that changes whenever either of them, or
+# anything about the mode that could change its frames, changes
+def cache_key(mode, n):
+    description = repr((version, n, mode.cache_parameters()))
+    return hashlib.sha1(description.encode()).digest()
+
+# Takes the name of a mode and a key and returns the path of the cache file for them
+def cache_path(name, key):
+    return os.path.join(cache_directory, "{}_{}.frames".format(name, key.hex()[:16]))
+
+# Takes the name of a mode and a key and returns the Recording in the matching cache file, or
+# None if there isn't a valid one
+def load(name, key):
+    path = cache_path(name, key)
+    try:
+        with open(path, "rb") as file:
+            header = file.read(header_size)
+        if len(header) != header_size:
+            return None
+        file_magic, file_version, reserved, frame_count, n, file_key = struct.unpack(header_format, header)
+        if file_magic != magic or file_version != version or file_key != key or frame_count == 0:
+            return None
+        if os.path.getsize(path) != header_size + frame_count * (n * 4 + 4):
+            return None
+        frames = numpy.memmap(path, dtype=numpy.uint8, mode="r", offset=header_size, shape=(frame_count, n, 4))
+        delays = numpy.memmap(path, dtype=numpy.float32, mode="r", offset=header_size + frames.nbytes, shape=(frame_count,))
+    except OSError:
+        return None
+    return Recording(key, frames, delays)
+
+# Generator that runs one cycle of a mode on the strip and writes every frame it renders to a
+# new cache file, yielding the mode's delays as it goes. Replaces any older recordings of the
+# mode, and returns the new Recording, or None if the cycle was too big to keep
+def record(mode, leds, key, max_bytes):
+    os.makedirs(cache_directory, exist_ok=True)
+    path = cache_path(mode.name, key)
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    frame_limit = max_bytes // (leds.n * 4 + 4)
+    delays = []
+    start = time.monotonic()
+    try:
+        with open(temporary_path, "wb") as file:
+            # Leave room for the header, then stream frames to the file as they're rendered
+            file.write(bytes(header_size))
+            for delay in mode.cycle(leds):
+                if delays is not None:
+                    if len(delays) < frame_limit:
+                        file.write(leds.pixels.tobytes())
+                        delays.append(delay)
+                    else:
+                        delays = None
+                yield delay
+            if delays:
+                file.write(numpy.array(delays, dtype=numpy.float32).tobytes())
+                file.seek(0)
+                file.write(struct.pack(header_format, magic, version, 0, len(delays), leds.n, key))
+    finally:
+        # Don't leave half a recording behind if the cycle gets cut short or turns out not to fit
+        if not delays or os.path.getsize(temporary_path) != header_size + len(delays) * (leds.n * 4 + 4):
+            os.remove(temporary_path)
+    if not delays:
+        logging.getLogger(__name__).debug("Didn't cache {}, cycle was empty or too big".format(mode.name))
+        return None
+
+    # Swap the new recording in for the old ones
+    for file_name in os.listdir(cache_directory):
+        if file_name.startswith(mode.name + "_") and file_name.endswith(".frames"):
+            os.remove(os.path.join(cache_directory, file_name))
+    os.replace(temporary_path, path)
+    logging.getLogger(__name__).debug("Cached {} frames of {} in {:.1f} seconds".format(len(delays), mode.name, time.monotonic() - start))
+    return load(mode.name, key)
@@ -0,0 +1,83 @@
+import time
+import logging
+from threading import Event
+
+# Schedules frames against monotonic deadlines. Each frame's period is measured from the
+# previous deadline, so time spent rendering and showing comes out of the period instead of
+# being added to it and animations keep their nominal speed
+class Frame_Clock():
+    # ATTRIBUTES
+    # event (Event): Event used to sleep until the deadline. Setting it wakes the clock early
+    # deadline (float): Monotonic time that the current frame period ends at, None to start over
+    # frames (int): Number of frames scheduled since the last report
+    # overruns (int): Number of frames since the last report that ended after their deadline
+    # worst_overrun (float): Largest number of seconds a frame has ended past its deadline since the last report
+    max_lag = .25 # seconds behind schedule before giving up on catching up
+    report_interval = 60 # seconds between overrun reports
+    
+    # Constructor. Takes an event that other threads can set to cut a sleep short
+    def __init__(self, event=None):
+        # Set up logger object
+        self.logger = logging.getLogger(__name__)
+        
+        # Initialize state
+        self.event = Event() if event is None else event
+        self.deadline = None
+        self.last_report = time.monotonic()
+        self.frames = 0
+        self.overruns = 0
+        self.worst_overrun = 0
+        
+    # Start scheduling from the next frame instead of from the previous deadline
+    def reset(self):
+        self.deadline = None
+        
+    # Returns whether it's time to render the next frame
+    def is_due(self):
+        return self.deadline is None or time.monotonic() >= self.deadline
+        
+    # Schedules the end of a frame that was just shown, period seconds after the previous deadline.
+    # Returns the number of seconds left in the period, which is negative if the frame overran
+    def advance(self, period):
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += period
+        remaining = self.deadline - now
+        self.frames += 1
+        
+        # Record overruns, and start over from now if the clock is too far behind to catch up
+        if remaining <= 0:
+            self.overruns += 1
+            self.worst_overrun = max(self.worst_overrun, -remaining)
+            if -remaining > self.max_lag:
+                self.deadline = now
+                
+        # Periodically report overruns
+        if now - self.last_report > self.report_interval:
+            self.report(now)
+        return remaining
+        
+    # Sleeps until the deadline or until the event is set, whichever comes first
+    def sleep(self):
+        if self.deadline is None:
+            return
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0:
+            self.event.wait(remaining)
+            
+    # Schedules the end of a frame and sleeps until then
+    def wait(self, period):
+        remaining = self.advance(period)
+        self.sleep()
+        return remaining
+        
+    # Logs the overruns since the last report and starts counting again
+    def report(self, now):
+        if self.overruns > 0:
+            self.logger.debug("{} of {} frames overran their deadline, worst by {:.1f} ms".format(
+                self.overruns, self.frames, self.worst_overrun * 1000))
+        self.last_report = now
+        self.frames = 0
+        self.overruns = 0
+        self.worst_overrun = 0
@@ -0,0 +1,141 @@
+import numpy
+from Frame_Clock import Frame_Clock
+from threading import Thread, Event, Lock
+import logging
+
+# Output stage that transmits frames on its own thread so the next frame can be rendered while
+# the current one is being sent. Holds two frame buffers: the back buffer receives the newest
+# frame and the front buffer holds the frame being transmitted. If a new frame arrives before
+# the last one was picked up, the stale frame is dropped instead of queued
+#
+# Frames can also be rendered ahead into a ring of up to depth frames, each with the time to
+# show it for. The output thread paces those out on its own clock, so a pause on the thread that
+# renders them doesn't show up on the strip as long as the ring doesn't run dry
+class Frame_Output(Thread):
+    # ATTRIBUTES
+    # frame_buffer (Frame_Buffer): Transfers frames to the strip
+    # back (numpy array): Newest frame waiting to be transmitted
+    # front (numpy array): Frame currently being transmitted
+    # frame_ready (Event): Set when the back buffer or the ring holds a frame that hasn't been transmitted
+    # pending (bool): Whether the back buffer holds a frame that hasn't been transmitted
+    # ring (numpy array): (depth, n, 4) frames rendered ahead, oldest first from head
+    # delays (list of floats): Seconds to show each frame in the ring for
+    # head (int): Index in the ring of the oldest frame
+    # queued (int): Number of frames in the ring
+    # clock (Frame_Clock): Paces the frames in the ring. Its event cuts a frame short when the ring is flushed
+    # space_event (Event): Set whenever a frame is taken out of the ring, so the renderer can add another
+    # transmitted (int): Number of frames transmitted
+    # dropped (int): Number of frames replaced or flushed before they were transmitted
+    wait_time = 1 # seconds
+    
+    # Constructor
+    def __init__(self, stop_event, frame_buffer, depth=0, space_event=None):
+        # Set up logger object
+        self.logger = logging.getLogger(__name__)
+        
+        # Initialize buffers
+        self.frame_buffer = frame_buffer
+        self.back = numpy.zeros_like(frame_buffer.pixels)
+        self.front = numpy.zeros_like(frame_buffer.pixels)
+        self.lock = Lock()
+        self.frame_ready = Event()
+        self.pending = False
+        self.transmitted = 0
+        self.dropped = 0
+        
+        # Initialize the ring of frames rendered ahead
+        self.depth = depth
+        self.ring = numpy.zeros((depth, frame_buffer.n, 4), dtype=numpy.uint8)
+        self.delays = [0] * depth
+        self.head = 0
+        self.queued = 0
+        self.clock = Frame_Clock()
+        self.restart = False
+        self.space_event = space_event
+        
+        # Initialize thread
+        Thread.__init__(self, name="Frame Output")
+        self.stop_event = stop_event
+        Thread.start(self)
+        
+    # Hands a frame to the output thread to transmit right away. Copies it into the back buffer,
+    # replacing the frame already there if it hasn't been transmitted yet, and flushes the ring
+    def submit(self, pixels):
+        with self.lock:
+            if self.pending:
+                self.dropped += 1
+            self.flush_ring()
+            self.back[:] = pixels
+            self.pending = True
+            self.frame_ready.set()
+    
+    # Returns whether there's room in the ring for another frame
+    def has_space(self):
+        return self.queued < self.depth
+    
+    # Adds a frame to the end of the ring, to be shown for delay seconds once the frames ahead of it
+    # are done. The ring must have space
+    def enqueue(self, pixels, delay):
+        with self.lock:
+            index = (self.head + self.queued) % self.depth
+            self.ring[index] = pixels
+            self.delays[index] = delay
+            self.queued += 1
+            self.frame_ready.set()
+    
+    # Drops every frame in the ring, so that the next frame handed over is shown right away
+    def flush(self):
+        with self.lock:
+            self.flush_ring()
+    
+    # Empties the ring and cuts the frame being shown short. Called with the lock held
+    def flush_ring(self):
+        self.dropped += self.queued
+        self.queued = 0
+        self.restart = True
+        self.clock.event.set()
+        if not self.pending:
+            self.frame_ready.clear()
+            
+    # Run method
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                # Wait for a frame, then move it to the front. Frames handed over to transmit right
+                # away take priority over the ring
+                if not self.frame_ready.wait(self.wait_time):
+                    continue
+                with self.lock:
+                    if self.restart:
+                        self.restart = False
+                        self.clock.reset()
+                        self.clock.event.clear()
+                    if self.pending:
+                        self.back, self.front = self.front, self.back
+                        self.pending = False
+                        delay = None
+                    elif self.queued > 0:
+                        self.front[:] = self.ring[self.head]
+                        delay = self.delays[self.head]
+                        self.head = (self.head + 1) % self.depth
+                        self.queued -= 1
+                    else:
+                        self.frame_ready.clear()
+                        continue
+                    if self.queued == 0 and not self.pending:
+                        self.frame_ready.clear()
+                if delay is not None and self.space_event is not None:
+                    self.space_event.set()
+                
+                # Transmit it, then wait out the frames from the ring
+                self.frame_buffer.transmit(self.front)
+                self.transmitted += 1
+                if delay is None:
+                    self.clock.reset()
+                else:
+                    self.clock.wait(delay)
+                
+            # Catch stray errors
+            except Exception:
+                self.logger.exception("Encountered uncaught exception")
+                self.stop_event.set()
@@ -0,0 +1,101 @@
+import socket
+import struct
+import time
+import logging
+from threading import Thread
+
+# Clock exchange for running several units in lockstep. One unit is the leader and answers time
+# requests with its own monotonic time. Every other unit asks it for the time every so often and
+# works out how far its own clock is from the leader's, NTP style, from the request that made the
+# quickest round trip. Time on the leader's clock is the shared time that every unit picks its
+# frames by, so units show the same frame no matter when they were switched to a mode
+sync_port = 4049
+request_format = struct.Struct(">4sBd") # magic, kind, time the request was sent
+reply_format = struct.Struct(">4sBdd") # magic, kind, time the request was sent, leader's time
+magic = b"WSYN"
+request = 0
+reply = 1
+
+class Sync_Clock(Thread):
+    # ATTRIBUTES
+    # leader (string): Host of the leader, None if this unit is the leader
+    # local_clock (function): Returns the local monotonic time
+    # offset (float): Seconds to add to the local time to get the leader's time
+    # samples (list of tuples): (round trip time, offset) from the latest replies
+    # synced (bool): Whether the offset is known yet
+    poll_interval = 1 # seconds between time requests to the leader
+    max_samples = 8 # replies to pick the quickest round trip from
+    wait_time = .5 # seconds
+    
+    # Constructor. If there's no leader, this unit is the leader
+    def __init__(self, stop_event, leader=None, port=sync_port, local_clock=time.monotonic):
+        # Set up logger object
+        self.logger = logging.getLogger(__name__)
+        
+        # Initialize state
+        self.leader = leader
+        self.port = port
+        self.local_clock = local_clock
+        self.offset = 0
+        self.samples = []
+        self.synced = leader is None
+        
+        # Open the socket, on the sync port for the leader and on any port for everyone else
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("", port if leader is None else 0))
+        self.socket.settimeout(self.wait_time)
+        
+        # Initialize thread
+        Thread.__init__(self, name="Sync Clock", daemon=True)
+        self.stop_event = stop_event
+        Thread.start(self)
+    
+    # Returns the shared time, which is the leader's monotonic time
+    def now(self):
+        return self.local_clock() + self.offset
+    
+    # Run method
+    def run(self):
+        last_request = None
+        while not self.stop_event.is_set():
+            try:
+                # Ask the leader for the time every so often
+                if self.leader is not None:
+                    now = self.local_clock()
+                    if last_request is None or now - last_request >= self.poll_interval:
+                        self.socket.sendto(request_format.pack(magic, request, now), (self.leader, self.port))
+                        last_request = now
+                
+                # Answer requests as the leader and take in replies as everyone else
+                try:
+                    packet, address = self.socket.recvfrom(reply_format.size)
+                except socket.timeout:
+                    continue
+                received = self.local_clock()
+                if self.leader is None and len(packet) == request_format.size:
+                    packet_magic, kind, sent = request_format.unpack(packet)
+                    if packet_magic == magic and kind == request:
+                        self.socket.sendto(reply_format.pack(magic, reply, sent, self.local_clock()), address)
+                elif self.leader is not None and len(packet) == reply_format.size:
+                    packet_magic, kind, sent, leader_time = reply_format.unpack(packet)
+                    if packet_magic == magic and kind == reply:
+                        self.add_sample(sent, leader_time, received)
+            
+            # Keep trying if the network goes away
+            except OSError:
+                self.logger.exception("Couldn't exchange time with the leader")
+                self.stop_event.wait(self.poll_interval)
+    
+    # Takes the local time a request was sent and a reply received at and the leader's time in the
+    # reply, and updates the offset. The leader's time is assumed to be from halfway through the
+    # round trip, so the offset comes from the quickest recent round trip, which can be off by the least
+    def add_sample(self, sent, leader_time, received):
+        round_trip = received - sent
+        if round_trip < 0:
+            return
+        self.samples.append((round_trip, leader_time + round_trip / 2 - received))
+        del self.samples[:-self.max_samples]
+        round_trip, self.offset = min(self.samples)
+        if not self.synced:
+            self.logger.info("Synced with {}, {:.1f} ms round trip".format(self.leader, round_trip * 1000))
+        self.synced = True
@@ -1,7 +1,22 @@
 import Modes
-import neopixel
+import Pixel_Protocols
+import Compositor
+import Frame_Cache
+from Frame_Sync import Sync_Clock
+from Transition import Transition
+from Frame_Buffer import Frame, Frame_Buffer
+from Frame_Clock import Frame_Clock
+from Frame_Output import Frame_Output
+from Output_Driver import Byte_Driver, Art_Net_Driver, SACN_Driver, DDP_Driver
+from Topology import Topology
+from Allocation_Counter import Allocation_Counter
+from Pixel_Push import Pixel_Slot, Push_Mode
+import neopixel_write
+import digitalio
 import board
 import time
+import gc
+import tracemalloc
 from threading import Thread, Event, Lock
 import logging
 import random
@@ -13,24 +28,73 @@ H = 0 # hour index in alarms
 M = 1 # minute index in alarms
 
 class LED_Strip(Thread):
-    # Constructor
-    def __init__(self, stop_event, to_tcp_server, to_led_strip):      
+    pipeline_output = True # transmit frames on a separate thread while the next one renders
+    render_process = False # render in a separate process that hands frames back through shared memory
+    render_ahead = 4 # frames to render ahead of time for modes that allow it, 0 to render every frame just in time
+    default_transition_time = 1 # seconds to crossfade between modes
+    cache_frames = True # replay recordings of modes that render the same frames every cycle
+    lockstep = False # replay recordings by a clock shared with other units, so they all show the same frame
+    sync_leader = None # host of the unit that keeps the shared clock, None for this unit to keep it
+    follow_offset = None # pixel to start showing a leader's multicast frames from at startup, None to render modes here
+    manage_gc = False # freeze objects made at startup and only run full garbage collections between frames
+    gc_interval = 30 # seconds between full garbage collections when managing them
+    gc_idle_time = .01 # seconds that have to be left before the next frame to run a full garbage collection
+    trace_allocations = False # trace memory allocations to log the most each frame has allocated at once, which slows rendering down
+    # Physical strips that make up the canvas, in order. Each one has the board pin its data line is
+    # on, its number of pixels, and whether it's wired in reverse. The Neopixel driver only has one
+    # channel, so only one pin output is supported. More strips have to be chained off its data line,
+    # where they count as one strip, or be on the network. Strips on network pixel controllers have
+    # a protocol, "artnet" or "sacn", and the controller's host and first universe instead of a pin, like
+    # {"protocol" : "artnet", "host" : "192.168.1.50", "universe" : 0, "n" : 300, "reverse" : False}
+    # A leader that renders for followers has a "ddp" output as big as all of theirs put together,
+    # which multicasts its part of the canvas to them, with an optional host to send it to instead
+    outputs = [
+        {"pin" : "D18", "n" : 30, "reverse" : False},
+    ]
+    
+    # Constructor. Frames go out to the strip, unless an output is given to take them instead
+    def __init__(self, stop_event, to_tcp_server, to_led_strip, output=None):      
         # Set up logger object
         self.logger = logging.getLogger(__name__)
 
-        # Initialize Neopixel strip
-        self.leds = neopixel.NeoPixel(
-            pin = board.D18,
-            n = 30,
-            bpp = 4,
-            brightness = 1,
-            auto_write = False,
-            pixel_order = neopixel.GRBW
-        )
+        # Initialize the frame clock, which wakes up early when a command arrives
+        self.wakeup = getattr(to_led_strip, "wakeup", Event())
+        self.clock = Frame_Clock(self.wakeup)
+        
+        # Initialize the slot that clients push frames through, if whatever sends commands has one
+        self.pixel_slot = getattr(to_led_strip, "pixel_slot", None)
+        
+        # Initialize the frame buffer that modes render the whole canvas into
+        if output is not None:
+            self.leds = Frame(output.n)
+            self.output = output
+        else:
+            self.leds = make_frame_buffer(self.outputs)
+            if self.pipeline_output:
+                self.output = Frame_Output(stop_event, self.leds, self.render_ahead, self.wakeup)
+            else:
+                self.output = None
                                       
-        # Initialize state
+        # Initialize state. frames is the generator for the current cycle of the mode, and previous_mode
+        # is the mode to go back to when a stream stops
         self.mode = Modes.Color([0, 0, 0, 0])
+        self.previous_mode = self.mode
+        if self.follow_offset is not None:
+            self.mode = Modes.Follow([self.follow_offset])
+        self.frames = None
+        self.transition_time = self.default_transition_time
+        
+        # Initialize the clock shared with other units
+        if self.lockstep:
+            self.sync_clock = Sync_Clock(stop_event, self.sync_leader)
+        else:
+            self.sync_clock = None
                           
+        # Initialize the allocation count, which is logged along with the frame clock's reports
+        self.allocations = Allocation_Counter()
+        self.last_report = time.monotonic()
+        self.last_collection = time.monotonic()
+        
         # Initialize queues
         self.to_tcp_server = to_tcp_server
         self.to_led_strip = to_led_strip
@@ -42,30 +106,155 @@ class LED_Strip(Thread):
                 
     # Run method
     def run(self):
+        # Leave everything that exists by now out of garbage collection, and stop full collections
+        # from happening in the middle of a frame
+        if self.manage_gc:
+            gc.freeze()
+            threshold, threshold_1, threshold_2 = gc.get_threshold()
+            gc.set_threshold(threshold, threshold_1, 2 ** 31 - 1)
+        if self.trace_allocations:
+            tracemalloc.start()
+            
         while not self.stop_event.is_set():
             try:
-                # Receive messages from other threads
+                # Receive every pending message from other threads. Clear the wakeup first so that a
+                # message that arrives after emptying the queue still cuts the next sleep short
+                self.wakeup.clear()
+                received_messages = []
                 try:
-                    received_message = self.to_led_strip.get_nowait()
-                    sender = received_message[0]
-                    message = received_message[1]
-                    reply = self.receive_message(message)
-                    # Send the reply back to the sender thread if it needs a reply
-                    if sender == "TCP_Server":
-                        self.to_tcp_server.put_nowait(("LED_Strip", reply))
-                    else:
-                        self.logger.debug("Didn't send reply " + reply)
-                        
+                    while True:
+                        received_messages.append(self.to_led_strip.get_nowait())
                 except queue.Empty:
                     pass
+                if len(received_messages) > 0:
+                    self.receive_messages(received_messages)
+                    # Render the new state right away, dropping any frames rendered ahead of it
+                    self.clock.reset()
+                    if self.output is not None and self.output.depth > 0:
+                        self.output.flush()
                 
-                # Cycle
-                self.mode.cycle(self.leds)
+                # Show a pushed frame as soon as it arrives
+                if isinstance(self.mode, Push_Mode) and self.pixel_slot.fresh:
+                    self.clock.reset()
+                
+                # Render the next frame of the mode once it's due. Modes that allow it fill the output's
+                # ring of frames instead, and the output shows them on schedule
+                if self.clock.is_due():
+                    if self.output is not None and self.output.depth > 0 and self.mode.render_ahead:
+                        while self.output.has_space() and self.mode.render_ahead:
+                            # Carry on into the next cycle when one ends, unless a new cycle ends without a frame
+                            new_cycle = self.frames is None
+                            frame_time = self.next_frame()
+                            if frame_time is None:
+                                if new_cycle:
+                                    break
+                                continue
+                            self.output.enqueue(self.leds.pixels, frame_time)
+                        self.clock.reset()
+                    else:
+                        frame_time = self.next_frame()
+                        if frame_time is None:
+                            continue
+                
+                        # Show the frame and schedule the next one
+                        if self.output is None:
+                            self.leds.show()
+                        else:
+                            self.output.submit(self.leds.pixels)
+                        self.clock.advance(frame_time)
+                
+                # Use the time before the next frame to collect garbage and report
+                if self.manage_gc:
+                    self.collect_garbage()
+                if time.monotonic() - self.last_report > self.clock.report_interval:
+                    self.report()
+                
+                # Sleep until the next frame is due, a command arrives, or there's room to render ahead
+                if self.clock.deadline is None:
+                    self.wakeup.wait(self.output.wait_time)
+                else:
+                    self.clock.sleep()
                 
             # Catch stray errors
             except Exception:
                 self.logger.exception("Encountered uncaught exception")
                 self.stop_event.set()
+    
+    # Render the next frame of the mode into leds, starting a new cycle when the last one is over.
+    # Returns the time to show the frame for, or None if the cycle ended without one
+    def next_frame(self):
+        if self.frames is None:
+            self.frames = self.mode.cycle(self.leds)
+        self.allocations.start()
+        try:
+            frame_time = next(self.frames)
+        except StopIteration:
+            self.frames = None
+            # Once a crossfade is over, the incoming mode takes over
+            if isinstance(self.mode, Transition) and self.mode.is_done():
+                self.mode = self.mode.incoming.mode
+            # Once a stream stops, go back to the mode that was running before it. A crossfade into the
+            # stream ends when the stream stops, so check it right after taking over from one too
+            if isinstance(self.mode, Modes.Stream) and self.mode.timed_out:
+                self.logger.info("Stream stopped, going back to " + self.previous_mode.name)
+                self.set_mode(self.previous_mode)
+            return None
+        self.allocations.stop()
+        return frame_time
+        
+    # Run a full garbage collection if it's been long enough since the last one and nothing is due for
+    # a while, either because the next frame is far enough off or because the output's ring is full
+    def collect_garbage(self):
+        now = time.monotonic()
+        if now - self.last_collection < self.gc_interval:
+            return
+        if self.clock.deadline is None:
+            idle = self.output is not None and self.output.depth > 0 and not self.output.has_space()
+        else:
+            idle = self.clock.deadline - now > self.gc_idle_time
+        if idle:
+            collected = gc.collect()
+            self.last_collection = time.monotonic()
+            self.logger.debug("Collected {} objects in {:.1f} ms".format(collected, (self.last_collection - now) * 1000))
+            
+    # Log the peak memory allocated by the frames since the last report, then start counting again
+    def report(self):
+        if self.allocations.frames > 0:
+            self.logger.debug("Frames allocated {:.0f} bytes at once at their peak on average over {} frames, {} at most".format(
+                self.allocations.per_frame(), self.allocations.frames, self.allocations.peak))
+        self.allocations.reset()
+        self.last_report = time.monotonic()
+
+    # Receive a list of [sender, message] pairs and handle them in order. Runs of modify messages
+    # that change the same thing are folded into one net change, and every sender gets a reply
+    def receive_messages(self, received_messages):
+        index = 0
+        while index < len(received_messages):
+            # Collect the run of modify messages for the same thing that starts here
+            run = received_messages[index:index + 1]
+            channel = modify_channel(run[0][1])
+            if channel is not None:
+                while index + len(run) < len(received_messages) and modify_channel(received_messages[index + len(run)][1]) == channel:
+                    run.append(received_messages[index + len(run)])
+            index += len(run)
+            
+            # Handle single messages normally, otherwise apply the net change of the whole run
+            if len(run) == 1:
+                reply = self.receive_message(run[0][1])
+            else:
+                self.logger.debug("Combining {} messages to modify {}".format(len(run), channel))
+                net = sum(1 if modify_direction(message) == "increase" else -1 for sender, message in run)
+                if net == 0:
+                    reply = "Did nothing, modifications canceled out"
+                else:
+                    reply = self.mode.modify(["increase" if net > 0 else "decrease", channel], abs(net))
+                    
+            # Send the reply back to every sender thread that needs a reply
+            for sender, message in run:
+                if sender == "TCP_Server":
+                    self.to_tcp_server.put_nowait(("LED_Strip", reply))
+                else:
+                    self.logger.debug("Didn't send reply " + reply)
 
     # Receive a message and set mode accordingly. Return a reply saying whether or not the mode was set
     def receive_message(self, message):
@@ -82,17 +271,140 @@ class LED_Strip(Thread):
             if name == "modify":
                 return self.mode.modify(args)
         
-            # Otherwise, check if the message is a new mode
+            # If the message starts with "layer", add, replace or remove a layer on top of the current mode
+            if name == "layer":
+                return self.receive_layer(args)
+        
+            # If the message starts with "push", show frames pushed by the client from now on
+            if name == "push":
+                if self.pixel_slot is None:
+                    raise ValueError("Nothing to push frames through")
+                self.pixel_slot.reset_counts()
+                if not isinstance(self.mode, Push_Mode):
+                    self.set_mode(Push_Mode(self.pixel_slot))
+                return "Pushing frames"
+            
+            # If the message starts with "transition", set how long to crossfade between modes
+            if name == "transition":
+                transition_time = float(args[0])
+                if transition_time < 0:
+                    raise ValueError("Transition time can't be negative")
+                self.transition_time = transition_time
+                return "Set transition time to {} seconds".format(transition_time)
+        
+            # Otherwise, check if the message is a new mode and crossfade to it
             mode_class = Modes.get_class(name)
             if mode_class is None:
                 raise ValueError("Invalid mode name")
-            self.mode = mode_class(args)
+            mode = mode_class(args)
+            if self.cache_frames and mode.cacheable:
+                mode = Frame_Cache.Cached_Mode(mode, self.sync_clock)
+            self.set_mode(mode)
             reply = "Set mode to " + name
-            self.logger.debug("Mode is " + self.mode.name)
+            self.logger.debug("Mode is " + mode.name)
             
         except (ValueError, IndexError) as e:
             reply = "Couldn't set mode, encountered error: " + str(e)
             
         return reply
     
+    # Switch to a new mode, crossfading to it if there's a transition time. Remembers the mode that was
+    # running, or that was being faded in, so a stream can go back to it
+    def set_mode(self, mode):
+        previous_mode = self.mode.incoming.mode if isinstance(self.mode, Transition) else self.mode
+        if not isinstance(previous_mode, Modes.Stream):
+            self.previous_mode = previous_mode
+        if self.transition_time > 0:
+            self.mode = Transition(self.mode, mode, self.transition_time)
+        else:
+            self.mode = mode
+        self.end_cycle()
+        
+    # Stops the current cycle of the mode, so the next frame starts a new one. Closing it right away
+    # lets the mode let go of what it holds, like a crossfade's layers, before anything else starts
+    def end_cycle(self):
+        if self.frames is not None:
+            self.frames.close()
+            self.frames = None
+        
+    # Receive the arguments of a layer message and set the layers accordingly. Return a reply saying what happened
+    def receive_layer(self, args):
+        # Remove a layer. Once only the base layer is left, go back to running it on its own
+        if len(args) == 2 and args[1] == "off":
+            if not isinstance(self.mode, Compositor.Compositor) or args[0] == "base":
+                return "Couldn't remove layer, no layer named " + args[0]
+            if not self.mode.remove_layer(args[0]):
+                return "Couldn't remove layer, no layer named " + args[0]
+            if len(self.mode.layers) == 1:
+                self.mode.layers[0].close()
+                self.mode = self.mode.layers[0].mode
+                self.end_cycle()
+            return "Removed layer " + args[0]
+            
+        # Add or replace a layer, turning the current mode into the base layer if there aren't any layers yet
+        layer = Compositor.parse_layer(args)
+        if not isinstance(self.mode, Compositor.Compositor):
+            self.mode = Compositor.Compositor(self.mode)
+            self.end_cycle()
+        self.mode.set_layer(layer)
+        return "Set layer " + layer.name + " to " + layer.mode.name
+    
+
+# Takes a list of outputs like LED_Strip.outputs and returns a frame buffer for the whole canvas, with a
+# driver that writes raw GRBW bytes to each strip on a pin and one that sends packets to each strip on
+# the network
+def make_frame_buffer(outputs):
+    if sum(1 for output in outputs if output.get("protocol") is None) > 1:
+        raise ValueError("Only one pin output is supported. Chain the other strips off its data line or put them on the network")
+    drivers = []
+    for output in outputs:
+        protocol = output.get("protocol")
+        if protocol == "artnet":
+            driver = Art_Net_Driver(output["n"], output["host"], output.get("universe", 0))
+        elif protocol == "sacn":
+            driver = SACN_Driver(output["n"], output.get("host"), output.get("universe", 1))
+        elif protocol == "ddp":
+            driver = DDP_Driver(output["n"], output.get("host", Pixel_Protocols.ddp_group))
+        else:
+            driver = Byte_Driver(
+                n = output["n"],
+                transport = neopixel_transport(output["pin"]),
+                pixel_order = "GRBW"
+            )
+        drivers.append((driver, output["reverse"]))
+    return Frame_Buffer(Topology(drivers))
+
+# Takes the name of a board pin and returns a function that writes raw bytes out on it with the Neopixel protocol
+def neopixel_transport(pin_name):
+    pin = digitalio.DigitalInOut(getattr(board, pin_name))
+    pin.direction = digitalio.Direction.OUTPUT
+    return lambda buffer: neopixel_write.neopixel_write(pin, buffer)
+    
+# Takes a message and returns the field that it modifies if it's a valid modify message, otherwise None
+def modify_channel(message):
+    fields = list(filter(None, re.split(" |,", message)))
+    if len(fields) == 3 and fields[0] == "modify" and fields[1] in ("increase", "decrease"):
+        return fields[2]
+    return None
+    
+# Takes a valid modify message and returns whether it increases or decreases
+def modify_direction(message):
+    return list(filter(None, re.split(" |,", message)))[1]
+    
+
+# Queue of messages for the LED strip. Sets the wakeup event whenever a message is put on it
+# so the strip can stop waiting for its next frame and handle the message right away. Also carries
+# the slot that the TCP server hands pushed frames to the strip through, if push is set. The slot
+# only works within one process, so leave it out when the strip renders in another one
+class Command_Queue(queue.Queue):
+    # Constructor
+    def __init__(self, maxsize=0, push=True):
+        queue.Queue.__init__(self, maxsize)
+        self.wakeup = Event()
+        self.pixel_slot = Pixel_Slot(self.wakeup) if push else None
+
+    # Called by put() and put_nowait() with the queue locked
+    def _put(self, item):
+        queue.Queue._put(self, item)
+        self.wakeup.set()
 
@@ -1,12 +1,27 @@
+import Pixel_Protocols
 import time
 import random
-import collections
-from threading import Event
+import socket
+import struct
+import numpy
 
 # Implement a default version of every optional function
+#
+# Every mode implements cycle(leds) as a generator. Each step renders one frame into
+# leds.pixels and yields the number of seconds to show it for. The LED strip shows the
+# frame and services commands between steps, and starts a new cycle once the generator
+# is exhausted
+#
+# Modes that are cacheable render exactly the same frames every cycle, so one cycle can be
+# recorded and replayed in place of the mode. Modes that render ahead only depend on their own
+# state, so their frames can be rendered before they're due and shown later on schedule
 class Mode():
-    # Takes arguments specifying what about the state to modify, calls a modifying function, returns what was modified
-    def modify(self, args):
+    cacheable = False
+    render_ahead = True
+    
+    # Takes arguments specifying what about the state to modify, calls a modifying function count
+    # times, returns what was modified
+    def modify(self, args, count=1):
         # Parse first argument
         if args[0] == "increase":
             increase = True
@@ -17,12 +32,17 @@ class Mode():
             
         # Parse second argument
         if args[1] == "brightness":
-            return self.modify_brightness(increase)
+            modify_function = lambda: self.modify_brightness(increase)
         elif args[1] in "rgbw":
-            return self.modify_color(increase, args[1])
+            modify_function = lambda: self.modify_color(increase, args[1])
         else:
             return "Did nothing, invalid second argument"
             
+        # Apply the modification, once for each request that was combined into this one
+        for i in range(count):
+            reply = modify_function()
+        return reply
+            
 
     def modify_brightness(self, increase):
         return "Nothing defined to modify brightness for this mode"
@@ -30,33 +50,49 @@ class Mode():
     def modify_color(self, increase, color):
         return "Nothing defined to modify color for this mode"
         
+    # Returns a sorted list of (name, value) pairs for every simple attribute of the mode and its
+    # classes. Anything that could change the frames a cacheable mode renders shows up here
+    def cache_parameters(self):
+        parameters = {}
+        for mode_class in reversed(type(self).__mro__):
+            parameters.update(vars(mode_class))
+        parameters.update(vars(self))
+        simple_types = (bool, int, float, str, tuple)
+        return sorted((name, value) for name, value in parameters.items()
+                      if not name.startswith("__") and isinstance(value, simple_types))
+        
 
 class Alarm(Mode):
+    # ATTRIBUTES NOT INHERITED
+    # start (float): Unix time that the alarm started at. Brightness is calculated from the time since then
     name = "alarm"
     arg_dict = {}
     max_brightness = 5
     total_cycles = 1000
+    render_ahead = False # brightness comes from the time the frame is rendered at
     # Constructor - validate arguments, convert them to attributes, and exit
     def __init__(self, args): 
         duration = int(args[0])
         if duration < 1:
             raise ValueError("Alarm duration needs to be greater than 0")
-        self.cycles = 0
         self.duration = duration
+        # The alarm clock passes in when the alarm started, otherwise start now
+        self.start = float(args[1]) if len(args) > 1 else time.time()
         # Calculate time to wait per cycle
         self.wait_time = float(self.duration / 2) / (float(self.total_cycles))
         
     def cycle(self, leds):
         # First half of the alarm
-        if self.cycles < self.total_cycles:
-            # Ramp up the brightness and run for the wait time
-            self.cycles += 1
-            brightness = (self.max_brightness * leds.n) * (self.cycles / self.total_cycles)
-            flatten(leds, int(brightness), self.wait_time)
+        elapsed = time.time() - self.start
+        if elapsed < self.duration / 2:
+            # Ramp up the brightness according to how far into the alarm it is
+            brightness = (self.max_brightness * leds.n) * (max(elapsed, 0) / (self.duration / 2))
+            flatten(leds, int(brightness))
         # Second half of the alarm
         else:
             # Stay on at the maximum brightness 
-            color(leds, 0, 0, self.max_brightness, self.max_brightness, self.wait_time)
+            color(leds, 0, 0, self.max_brightness, self.max_brightness)
+        yield self.wait_time
         
 class Color(Mode):
     name = "color"
@@ -78,7 +114,8 @@ class Color(Mode):
         self.w = int(args[3])
         
     def cycle(self, leds):
-        color(leds, self.r, self.g, self.b, self.w, self.wait_time)
+        color(leds, self.r, self.g, self.b, self.w)
+        yield self.wait_time
 
     def modify_brightness(self, increase):
         self.r = color_multiply(self.r, increase, self.multiply_increment)
@@ -106,40 +143,44 @@ class Color(Mode):
         
 class Rainbow(Mode):
     name = "rainbow"
-    arg_dict = {"none" : "Rainbow pattern"}
-    # Constructor
+    arg_dict = {
+        "none" : "Rainbow pattern",
+        "table" : "Rainbow pattern replayed from a precomputed table of every frame",
+    }
+    total_cycles = 255
+    cacheable = True
+    # Constructor - decide whether to replay a precomputed table of frames
     def __init__(self, args): 
         self.cycles = 0
+        self.use_table = len(args) > 0 and args[0] == "table"
+        self.positions = None
+        self.frames = None
         
     def cycle(self, leds):
-        # No idea how this works but it looks cool
-        for j in range(leds.n):
-            pixel_index = (j * 256 // leds.n) + self.cycles
-            pos = pixel_index & 255
-            if pos < 0 or pos > 255:
-                r = g = b = 0
-            elif pos < 85:
-                r = int(pos * 3)
-                g = int(255 - pos*3)
-                b = 0
-            elif pos < 170:
-                pos -= 85
-                r = int(255 - pos*3)
-                g = 0
-                b = int(pos*3)
+        # Build the wheel position of every pixel once for this strip length
+        if self.positions is None or len(self.positions) != leds.n:
+            self.positions = numpy.arange(leds.n) * 256 // leds.n
+            self.indices = numpy.empty(leds.n, dtype=numpy.intp)
+            self.frames = None
+            
+        # Go all the way around the color wheel once per cycle
+        while self.cycles < self.total_cycles:
+            if self.use_table:
+                # Render every frame of the rainbow once, then replay them
+                if self.frames is None:
+                    offsets = numpy.arange(self.total_cycles)[:, None]
+                    self.frames = wheel_table[(self.positions + offsets) & 255]
+                leds.pixels[:] = self.frames[self.cycles]
             else:
-                pos -= 170
-                r = 0
-                g = int(pos*3)
-                b = int(255 - pos*3)
-            leds[j] = (r, g, b, 0)
-        leds.show()
-        event.wait(.001)
+                # Look up the color of every pixel in the wheel table, offset by the number of cycles
+                numpy.add(self.positions, self.cycles, out=self.indices)
+                numpy.bitwise_and(self.indices, 255, out=self.indices)
+                numpy.take(wheel_table, self.indices, axis=0, out=leds.pixels)
             
-        # Increment cycles
-        self.cycles += 1
-        if self.cycles >= 255:
-            self.cycles = 0
+            # Increment cycles
+            self.cycles += 1
+            yield .001
+        self.cycles = 0
     
 
 class Fade(Mode):
@@ -151,6 +192,7 @@ class Fade(Mode):
         "0-255" : "Fade in and out of random colors with the specified white value",
     }
     cycle_time = .005
+    peak_level = 256
     default_white = 20
     add_increment = 20
     # Constructor - validate arguments, convert them to attributes, and exit
@@ -165,24 +207,18 @@ class Fade(Mode):
                 
         # Initialize color
         self.white = white
-        self.colors = collections.deque()
 
     def cycle(self, leds):
-        # If the list of colors to cycle in and out of is empty, build it up
-        if len(self.colors) == 0:
-            # Choose random color
-            r = random.random()
-            g = random.random()
-            b = random.random()
+        # Choose random color
+        r = random.random()
+        g = random.random()
+        b = random.random()
             
-            # Fade in and out
-            for i in list(range(256)) + list(range(256, -1, -1)):
-                self.colors.append((int(r * i), int(g * i), int(b * i)))
-                
-        # Otherwise, set the LEDS to the most recent color from the list
-        else:
-            r, g, b = self.colors.popleft()
-            color(leds, r, g, b, self.white, self.cycle_time)      
+        # Fade in up to the peak level and back out to 0, calculating each step as it's shown
+        for step in range(2 * self.peak_level + 1):
+            level = step if step < self.peak_level else 2 * self.peak_level - step
+            color(leds, int(r * level), int(g * level), int(b * level), self.white)
+            yield self.cycle_time
                     
     def modify_brightness(self, increase):
         increment = self.add_increment if increase else self.add_increment * -1
@@ -194,6 +230,7 @@ class Strobe(Mode):
     name = "strobe"
     arg_dict = {"none" : "Strobe pattern"}
     strobe_time = .2
+    cacheable = True
     # Constructor
     def __init__(self, args): 
         pass
@@ -201,16 +238,17 @@ class Strobe(Mode):
     def cycle(self, leds):
         # Flash all lights on and off
         for i in range(4):
-            color(leds, 255, 255, 255, 255, self.strobe_time)
-            color(leds, 0, 0, 0, 0, self.strobe_time)
+            color(leds, 255, 255, 255, 255)
+            yield self.strobe_time
+            color(leds, 0, 0, 0, 0)
+            yield self.strobe_time
         # Flash lights alternating
         for i in range(8):
-            for j in range(leds.n):
-                brightness = 255 * ((i + j) % 2)
-                leds[j] = (brightness, brightness, brightness, brightness)
-            leds.show()
-            event.wait(self.strobe_time / 2)
-            color(leds, 0, 0, 0, 0, self.strobe_time / 2)
+            leds.fill(0)
+            leds.pixels[(i + 1) % 2::2] = 255
+            yield self.strobe_time / 2
+            color(leds, 0, 0, 0, 0)
+            yield self.strobe_time / 2
 
 class Random(Mode):
     name = "random"
@@ -239,46 +277,33 @@ class Random(Mode):
         self.g = random.randint(0, 255)
         self.b = random.randint(0, 255)
         
-        # Initialize loop variables
-        self.colors = collections.deque()
-        self.time_to_wait = 0
-        
     def cycle(self, leds):
-        # Wait if holding the final color value
-        if self.time_to_wait > 0:
-            event.wait(self.cycle_time)
-            self.time_to_wait -= self.cycle_time
-        # If the list of colors to display is empty, build it up
-        elif len(self.colors) == 0:            
-            # Choose random color
-            new_r = random.randint(0, 255)
-            new_g = random.randint(0, 255)
-            new_b = random.randint(0, 255)
+        # Choose random color
+        new_r = random.randint(0, 255)
+        new_g = random.randint(0, 255)
+        new_b = random.randint(0, 255)
+        
+        # Calculate number of steps to take. If the new color is the same as the old one, pick again
+        diff_r = new_r - self.r
+        diff_g = new_g - self.g
+        diff_b = new_b - self.b
+        steps = max(abs(diff_r), abs(diff_g), abs(diff_b))
+        if steps == 0:
+            return
             
-            # Calculate number of steps to take
-            diff_r = new_r - self.r
-            diff_g = new_g - self.g
-            diff_b = new_b - self.b
-            steps = max(abs(diff_r), abs(diff_g), abs(diff_b))
+        # Transition towards the new color, calculating each step as it's shown
+        for i in range(steps):
+            r = int(self.r + diff_r * (i / steps))
+            g = int(self.g + diff_g * (i / steps))
+            b = int(self.b + diff_b * (i / steps))
+            color(leds, r, g, b, self.white)
+            yield self.cycle_time
             
-            # Build up list of colors to display
-            for i in range(steps):
-                red_val = int(self.r + diff_r * (i / steps))
-                green_val = int(self.g + diff_g * (i / steps))
-                blue_val = int(self.b + diff_b * (i / steps))
-                self.colors.append((red_val, green_val, blue_val))
-                
-                
-        # Otherwise, display the next color in the list
-        else:
-            r, g, b = self.colors.popleft()
-            color(leds, r, g, b, self.white, self.cycle_time)
-            
-            # Check if this is the last step
-            if len(self.colors) == 0:
-                # Save the final color and hold it
-                self.r, self.g, self.b = [r, g, b]
-                self.time_to_wait = self.hold_time
+        # Save the final color and hold it
+        self.r, self.g, self.b = [r, g, b]
+        for i in range(round(self.hold_time / self.cycle_time)):
+            color(leds, r, g, b, self.white)
+            yield self.cycle_time
                 
     def modify_brightness(self, increase):
         increment = self.add_increment if increase else self.add_increment * -1
@@ -290,15 +315,17 @@ class Cylon(Mode):
     arg_dict = {"none" : "Moving dot pattern from a show I haven't seen"}
     cylon_time = .004
     cylon_color = (0, 0, 0, 10)
+    cacheable = True
     # Constructor
     def __init__(self, args): 
         pass
         
     def cycle(self, leds):
-        for i in list(range(leds.n - 1)) + list(range(leds.n - 1, 0, -1)):
-            color_one_led(leds, i, self.cylon_color)
-            leds.show()
-            event.wait(self.cylon_time)
+        # Go from the first LED to the last and back, without building a list of positions
+        last = leds.n - 1
+        for step in range(2 * last):
+            color_one_led(leds, step if step < last else 2 * last - step, self.cylon_color)
+            yield self.cylon_time
         
 
 class Scroll(Mode):
@@ -307,11 +334,13 @@ class Scroll(Mode):
     scroll_delta = .3
     initial_color = [128, 128, 128, 0]
     cycle_time = .05
-    # Constructor - initialize color
+    # Constructor - initialize color. Copy it so instances don't change the class's initial color
     def __init__(self, args): 
-        self.color = self.initial_color
+        self.color = list(self.initial_color)
+        self.ring = None
         
     def cycle(self, leds):
+        self.ring = Pixel_Ring.resize(self.ring, leds)
         # Pick either R, G, or B
         value_to_change = random.randint(0, 2)
         # Either subtract the delta from it or add the delta to it depending on a "coin flip"
@@ -319,7 +348,9 @@ class Scroll(Mode):
             self.color[value_to_change] += int(self.scroll_delta * (256 - self.color[value_to_change]))
         else:
             self.color[value_to_change] = int(self.color[value_to_change] * (1 - self.scroll_delta))
-        queue_push(leds, tuple(self.color), self.cycle_time, False)
+        self.ring.push(self.color, False)
+        self.ring.draw(leds)
+        yield self.cycle_time
 
 class Cascade(Mode):
     name = "cascade"
@@ -339,34 +370,34 @@ class Cascade(Mode):
                 raise ValueError
         # Initialize color
         self.white = white
-        self.colors = collections.deque()
+        self.ring = None
         
     def cycle(self, leds):
-        # If the list of colors is empty, build it up
-        if len(self.colors) == 0:
-            # Pick two of R, G, or B to raise (in random order) and raise them 
-            color = [0, 0, 0]
-            rgb_indices = [0, 1, 2]
-            rgb_indices.remove(random.randint(0, 2))
-            if random.random() >= .5:
-                rgb_indices.reverse()
-            for index in rgb_indices:
-                for i in range(255 // self.cascade_increment):
-                    color[index] += self.cascade_increment
-                    self.colors.append(tuple(color))
+        self.ring = Pixel_Ring.resize(self.ring, leds)
+        # Pick two of R, G, or B to raise (in random order) and raise them, pushing each step as it's calculated
+        color = [0, 0, 0, self.white]
+        rgb_indices = [0, 1, 2]
+        rgb_indices.remove(random.randint(0, 2))
+        if random.random() >= .5:
+            rgb_indices.reverse()
+        for index in rgb_indices:
+            for i in range(255 // self.cascade_increment):
+                color[index] += self.cascade_increment
+                color[3] = self.white
+                self.ring.push(color)
+                self.ring.draw(leds)
+                yield self.cycle_time
             
-            # Lower the two values raised in a random order 
-            if random.random() >= .5:
-                rgb_indices.reverse()
-            for index in rgb_indices:
-                for i in range(255 // self.cascade_increment):
-                    color[index] -= self.cascade_increment
-                    self.colors.append(tuple(color))
-                    
-        # Otherwise, set the LEDS to the most recent color from the list
-        else:
-            color = self.colors.popleft()
-            queue_push(leds, color + (self.white,), self.cycle_time)
+        # Lower the two values raised in a random order 
+        if random.random() >= .5:
+            rgb_indices.reverse()
+        for index in rgb_indices:
+            for i in range(255 // self.cascade_increment):
+                color[index] -= self.cascade_increment
+                color[3] = self.white
+                self.ring.push(color)
+                self.ring.draw(leds)
+                yield self.cycle_time
                 
     def modify_brightness(self, increase):
         increment = self.add_increment if increase else self.add_increment * -1
@@ -381,6 +412,9 @@ class Read(Mode):
         "2" : "Reading light for two people",
     }
     reading_color = (75, 0, 0, 75)
+    # LEDs to turn on, as positions on a strip of reference_length LEDs. Longer or shorter
+    # strips light up the same fraction of the strip
+    reference_length = 30
     one_light = (19, 20, 21)
     two_lights = (0, 1, 2, 19, 20, 21)
     cycle_time = .1
@@ -390,17 +424,232 @@ class Read(Mode):
             self.leds_to_turn_on = self.two_lights
         else:
             self.leds_to_turn_on = self.one_light
+        self.mask = None
+        self.color = numpy.array(self.reading_color, dtype=numpy.uint8)
+        
+    def cycle(self, leds):
+        # Work out which LEDs to turn on once for this strip length, as a column so it lines up
+        # with the pixels
+        if self.mask is None or len(self.mask) != leds.n:
+            self.mask = numpy.zeros((leds.n, 1), dtype=bool)
+            for i in self.leds_to_turn_on:
+                self.mask[i * leds.n // self.reference_length:(i + 1) * leds.n // self.reference_length] = True
+                
+        # Set LEDs that should be turned on to the reading color, turn off all other LEDs. Copying
+        # where the mask is set doesn't allocate the way indexing with it does
+        leds.fill(0)
+        numpy.copyto(leds.pixels, self.color, where=self.mask)
+        yield self.cycle_time
         
+class Stream(Mode):
+    # ATTRIBUTES NOT INHERITED
+    # protocol (string): Protocol the pixels are streamed with, "ddp" or "e131"
+    # universe (int): First E1.31 universe. Each universe carries the next universe_pixels pixels
+    # port (int): UDP port that packets are received on
+    # socket (socket): Non-blocking UDP socket that packets are received on, None between cycles
+    # frame (numpy array): Frame that packets are written into until it's complete and gets shown
+    # sequences (dictionary): Last sequence number accepted from every universe, or from DDP under 0
+    # pixel_offset (int): Pixel in the stream that the first pixel of the strip shows
+    # pushes (bool): Whether the DDP source marks the last packet of each frame
+    # dropped (int): Number of packets dropped for arriving late
+    # timed_out (bool): Set when the stream stops, so the LED strip can go back to the mode before it
+    name = "stream"
+    arg_dict = {
+        "ddp" : "Show pixels streamed over UDP with DDP",
+        "e131, universe" : "Show pixels streamed over UDP with E1.31 (sACN), starting from the universe given or 1",
+    }
+    render_ahead = False # frames come from packets as they arrive
+    poll_time = .005 # seconds between checks for new packets
+    timeout = 5 # seconds without packets before the stream counts as stopped, None to wait forever
+    buffer_size = 1500 # bytes in the largest packet that can be received
+    universe_pixels = Pixel_Protocols.e131_universe_size // 4
+    # Constructor - validate arguments, convert them to attributes, and start listening
+    def __init__(self, args):
+        self.protocol = args[0] if len(args) > 0 else "ddp"
+        if self.protocol == "ddp":
+            port = Pixel_Protocols.ddp_port
+            self.universe = None
+        elif self.protocol == "e131":
+            port = Pixel_Protocols.e131_port
+            self.universe = int(args[1]) if len(args) > 1 else 1
+            if not 1 <= self.universe <= 63999:
+                raise ValueError("Universe must be between 1 and 63999 inclusive")
+        else:
+            raise ValueError("Protocol must be ddp or e131")
+        self.port = port
+        self.open_socket()
+        self.buffer = bytearray(self.buffer_size)
+        self.packet = numpy.frombuffer(self.buffer, dtype=numpy.uint8)
+        self.frame = None
+        self.sequences = {}
+        self.pixel_offset = 0
+        self.pushes = False
+        self.dropped = 0
+        self.timed_out = False
+    
     def cycle(self, leds):
-        # Set LEDs that should be turned on to the reading color, turn off all other LEDs
-        for i in range(leds.n):
-            if i in self.leds_to_turn_on:
-                leds[i] = self.reading_color
+        # Listen again if the last cycle stopped listening. If the port was taken in the meantime,
+        # stop as if the stream had stopped
+        if self.socket is None:
+            try:
+                self.open_socket()
+            except ValueError:
+                self.timed_out = True
+                return
+        listener = self.socket
+        
+        # Match the frame to the strip, keeping what's shown until the first frame arrives
+        if self.frame is None or len(self.frame) != leds.n:
+            self.frame = leds.pixels.copy()
+            self.flat = self.frame.reshape(-1)
+        if self.protocol == "e131":
+            self.join_groups(leds.n)
+        
+        # Show frames as they arrive until packets stop coming
+        self.timed_out = False
+        last_packet = time.monotonic()
+        try:
+            while True:
+                received, complete, stopped = self.receive()
+                now = time.monotonic()
+                if received:
+                    last_packet = now
+                if complete:
+                    leds.pixels[:] = self.frame
+                if stopped or (self.timeout is not None and now - last_packet > self.timeout):
+                    self.timed_out = True
+                    return
+                yield self.poll_time
+        # Stop listening however the cycle ends, unless a newer cycle has a socket of its own by then
+        finally:
+            listener.close()
+            if self.socket is listener:
+                self.socket = None
+    
+    # Starts listening on the port, raising ValueError if it can't. Multicast groups have to be
+    # joined again on the new socket
+    def open_socket(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(("", self.port))
+            listener.setblocking(False)
+        except OSError as e:
+            listener.close()
+            raise ValueError("Couldn't listen on port {}: {}".format(self.port, e))
+        self.socket = listener
+        self.groups = 0
+    
+    # Receives every packet waiting on the socket and writes its pixels into the frame. Returns
+    # whether any packets were received, whether the frame is ready to show, and whether the
+    # source said it stopped
+    def receive(self):
+        received = False
+        complete = False
+        stopped = False
+        while True:
+            try:
+                size = self.socket.recv_into(self.buffer)
+            except BlockingIOError:
+                return received, complete, stopped
+            if self.protocol == "ddp":
+                packet = Pixel_Protocols.parse_ddp(self.buffer, size)
+                if packet is None:
+                    continue
+                sequence, offset, length, push, start, bytes_per_pixel = packet
+                # Sequence number 0 means the source doesn't number its packets
+                if sequence != 0:
+                    if Pixel_Protocols.is_late(self.sequences.get(0), sequence, 4, 8, repeats=False):
+                        self.dropped += 1
+                        continue
+                    self.sequences[0] = sequence
+                received = True
+                self.write_pixels(offset, start, length, bytes_per_pixel)
+                # Sources that never push show every packet as it arrives
+                self.pushes = self.pushes or push
+                complete = complete or push or not self.pushes
             else:
-                leds[i] = (0, 0, 0, 0)
-        leds.show()
-        event.wait(self.cycle_time)
+                packet = Pixel_Protocols.parse_e131(self.buffer, size)
+                if packet is None:
+                    continue
+                sequence, universe, options, start, channels = packet
+                index = universe - self.universe
+                if options & Pixel_Protocols.e131_preview or not 0 <= index < self.groups:
+                    continue
+                if Pixel_Protocols.is_late(self.sequences.get(universe), sequence, 8, 20):
+                    self.dropped += 1
+                    continue
+                self.sequences[universe] = sequence
+                received = True
+                if options & Pixel_Protocols.e131_terminated:
+                    stopped = True
+                    continue
+                self.write_pixels(index * Pixel_Protocols.e131_universe_size, start, channels, 4)
+                complete = True
+    
+    # Copies length bytes of pixel data from start in the packet into the frame at offset bytes into
+    # the stream. RGB data goes into the RGB channels of the pixels it covers
+    def write_pixels(self, offset, start, length, bytes_per_pixel):
+        # Skip the part of the data before the strip's offset into the stream
+        offset -= self.pixel_offset * bytes_per_pixel
+        if offset < 0:
+            start -= offset
+            length += offset
+            offset = 0
+        if bytes_per_pixel == 4:
+            length = min(length, len(self.flat) - offset)
+            if length > 0:
+                self.flat[offset:offset + length] = self.packet[start:start + length]
+        else:
+            first = offset // 3
+            count = min(length // 3, len(self.frame) - first)
+            if count > 0:
+                self.frame[first:first + count, :3] = self.packet[start:start + count * 3].reshape(count, 3)
+    
+    # Joins the multicast group of every universe needed to cover n pixels, so the stream can be
+    # multicast as well as sent straight here
+    def join_groups(self, n):
+        groups = -(-n // self.universe_pixels)
+        while self.groups < groups:
+            group = Pixel_Protocols.e131_group(self.universe + self.groups)
+            try:
+                request = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("0.0.0.0"))
+                self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, request)
+            except OSError:
+                pass # no multicast route, unicast still works
+            self.groups += 1
+
+# Mode for followers of a leader that renders the frames for a whole installation. Shows the part of
+# the frames the leader multicasts with DDP_Driver that starts at the strip's offset into them, so
+# nothing gets rendered here. Keeps showing the last frame if packets stop coming
+class Follow(Stream):
+    # ATTRIBUTES NOT INHERITED
+    # group (string): Multicast group the leader sends frames to
+    name = "follow"
+    arg_dict = {
+        "offset, group" : "Show frames multicast by a leader, starting from the pixel given or 0, on the group given or " + Pixel_Protocols.ddp_group,
+    }
+    timeout = None # hold the last frame until the mode changes
+    # Constructor - validate arguments, convert them to attributes, and join the group
+    def __init__(self, args):
+        pixel_offset = int(args[0]) if len(args) > 0 else 0
+        if pixel_offset < 0:
+            raise ValueError("Offset must be 0 or more")
+        self.group = args[1] if len(args) > 1 else Pixel_Protocols.ddp_group
+        Stream.__init__(self, ["ddp"])
+        self.pixel_offset = pixel_offset
         
+    # Joins the group as well as listening, raising ValueError if it can't
+    def open_socket(self):
+        Stream.open_socket(self)
+        try:
+            request = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, request)
+        except OSError as e:
+            self.socket.close()
+            self.socket = None
+            raise ValueError("Couldn't join group {}: {}".format(self.group, e))
+
 # Data for every mode:
         
 # Dictionary that matches each mode class name to the actual mode class
@@ -415,9 +664,9 @@ class_dict = {
     Scroll.name : Scroll,
     Cascade.name : Cascade,
     Read.name : Read,
+    Stream.name : Stream,
+    Follow.name : Follow,
 }
-# Dummy event object to use for waits. Do not ever set the internal flag
-event = Event()
 
 
 # Takes the name of a mode, returns the mode class
@@ -438,45 +687,83 @@ def mode_string(format_string):
             
 
 # Takes a number from 0 to 7650 inclusive and distributes the brightness as
-# blue/white along the LEDs, calls show(), and waits
-def flatten(leds, brightness, sleep_time):
+# blue/white along the LEDs. Does not call show()
+def flatten(leds, brightness):
     quotient = int(brightness // leds.n)
     remainder = int(brightness % leds.n)
-    for i in range(leds.n):
-        if i < remainder:
-            leds[i] = (0, 0, quotient + 1, quotient + 1)
-        else:
-            leds[i] = (0, 0, quotient, quotient)
-    leds.show()
-    event.wait(sleep_time)
+    leds.fill_rgbw(0, 0, quotient, quotient)
+    leds.pixels[:remainder, 2:] += 1
     
 # Set one LED to one color, set everything else to another color. Does not call show()
 def color_one_led(leds, index, color, other_color=(0, 0, 0, 0)):
-    for i in range(leds.n):
-        if i == index:
-            leds[i] = color
+    leds.fill(other_color)
+    leds.pixels[index] = color
+            
+# Circular buffer of pixels for modes that scroll. Pushing a color moves the head index
+# instead of shifting every pixel, and the shifted order is only copied out when drawn
+class Pixel_Ring():
+    # ATTRIBUTES
+    # n (int): Number of pixels in the ring
+    # pixels (numpy array): (n, 4) array of RGBW values, starting from the head and wrapping around
+    # head (int): Index in pixels of the leftmost LED
+    
+    # Constructor. Starts out with the colors currently in the frame
+    def __init__(self, leds):
+        self.n = leds.n
+        self.pixels = leds.pixels.copy()
+        self.head = 0
+        
+    # Takes an existing ring or None, returns a ring that matches the strip length
+    @staticmethod
+    def resize(ring, leds):
+        if ring is None or ring.n != leds.n:
+            return Pixel_Ring(leds)
+        return ring
+        
+    # Shift the colors either left or right and set the LED that was uncovered to the specified color
+    def push(self, color, dir_is_right=True):
+        if dir_is_right:
+            # Shift right, set leftmost LED to color
+            self.head = (self.head - 1) % self.n
+            self.pixels[self.head] = color
         else:
-            leds[i] = other_color
+            # Shift left, set rightmost LED to color
+            self.pixels[self.head] = color
+            self.head = (self.head + 1) % self.n
             
-# Shift the LED colors either left or right, set the remaining LED to the specified
-# color, call show() and wait
-def queue_push(leds, color, sleep_time, dir_is_right=True):
-    if dir_is_right:
-        # Shift LEDs right, set leftmost LED to color
-        leds[1:leds.n] = leds[0:leds.n - 1]
-        leds[0] = color
-    else:
-        # Shift LEDs left, set rightmost LED to color
-        leds[0:leds.n - 1] = leds[1:leds.n]
-        leds[leds.n - 1] = color
-    leds.show()
-    event.wait(sleep_time)
+    # Copies the colors into the frame in order from the leftmost LED. Does not call show()
+    def draw(self, leds):
+        tail = self.n - self.head
+        leds.pixels[:tail] = self.pixels[self.head:]
+        leds.pixels[tail:] = self.pixels[:self.head]
         
-# Sets every LED to the r, g, b, and w values given, calls show(), and sleeps for the time given
-def color(leds, r, g, b, w, sleep_time):
-    leds.fill((r, g, b, w))
-    leds.show()
-    event.wait(sleep_time)
+# Sets every LED to the r, g, b, and w values given. Does not call show()
+def color(leds, r, g, b, w):
+    leds.fill_rgbw(r, g, b, w)
+
+# Takes an array of color wheel positions from 0 to 255 and writes the matching
+# RGBW colors into out, an array with one row per position. The colors transition
+# r - g - b - back to r
+def wheel(positions, out):
+    section = numpy.minimum(positions // 85, 2)
+    third = (positions - section * 85) * 3
+    out[:] = 0
+    # Red to green
+    first = section == 0
+    out[first, 0] = third[first]
+    out[first, 1] = 255 - third[first]
+    # Green to blue
+    second = section == 1
+    out[second, 0] = 255 - third[second]
+    out[second, 2] = third[second]
+    # Blue back to red
+    last = section == 2
+    out[last, 1] = third[last]
+    out[last, 2] = 255 - third[last]
+    return out
+
+# RGBW color of every position on the color wheel, built once so modes can index into it
+wheel_table = wheel(numpy.arange(256), numpy.zeros((256, 4), dtype=numpy.uint8))
 
 # Closes the gap between a color value and its maximum or minimum value by the factor specified
 def color_multiply(color_value, increase, factor):
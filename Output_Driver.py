@@ -0,0 +1,262 @@
+import Pixel_Protocols
+import numpy
+import socket
+import time
+import uuid
+
+# Output drivers take whole RGBW frames from a Frame_Buffer and get them onto a strip. update()
+# copies a range of pixels from the frame into the driver, send() pushes everything to the strip
+
+# Driver for objects with the neopixel.NeoPixel interface, like Virtual_Strip. Goes through the
+# library's per-pixel assignment, so only use it where a byte transport isn't available
+class NeoPixel_Driver():
+    # ATTRIBUTES
+    # leds (NeoPixel): The strip object that frames get transferred to
+    # n (int): Number of pixels on the strip
+    
+    # Constructor
+    def __init__(self, leds):
+        self.leds = leds
+        self.n = leds.n
+        
+    # Copies the pixels from start to stop into the strip object
+    def update(self, frame, start, stop):
+        self.leds[start:stop] = frame[start:stop].tolist()
+        
+    # Shows the strip
+    def send(self):
+        self.leds.show()
+        
+
+# Driver that keeps the strip's raw bytes in a preallocated buffer. Reorders RGBW frames into the
+# strip's byte order in one vectorized pass and hands the whole buffer to the transport at once
+class Byte_Driver():
+    # ATTRIBUTES
+    # n (int): Number of pixels on the strip
+    # transport (function): Takes a bytes-like object and writes it out to the strip
+    # order (list of ints): Index in the RGBW frame of each byte in a pixel, in the order the strip expects
+    # buffer (bytearray): The raw bytes sent to the strip
+    # pixels (numpy array): (n, 4) view of the buffer
+    
+    # Constructor. pixel_order is a string like "GRBW" giving the byte order of the strip
+    def __init__(self, n, transport, pixel_order="GRBW"):
+        self.n = n
+        self.transport = transport
+        self.order = ["RGBW".index(channel) for channel in pixel_order]
+        self.buffer = bytearray(n * len(self.order))
+        self.pixels = numpy.frombuffer(self.buffer, dtype=numpy.uint8).reshape(n, len(self.order))
+        
+    # Reorders the pixels from start to stop into the byte buffer
+    def update(self, frame, start, stop):
+        numpy.take(frame[start:stop], self.order, axis=1, out=self.pixels[start:stop])
+        
+    # Writes the whole buffer to the strip in a single call
+    def send(self):
+        self.transport(self.buffer)
+        
+
+# Pure Python version of Byte_Driver that reorders one byte at a time. Produces the same bytes,
+# so it's useful for checking the vectorized driver against
+class Reference_Driver(Byte_Driver):
+    # Reorders the pixels from start to stop into the byte buffer
+    def update(self, frame, start, stop):
+        bpp = len(self.order)
+        for i in range(start, stop):
+            for byte, channel in enumerate(self.order):
+                self.buffer[i * bpp + byte] = int(frame[i][channel])
+
+
+# Driver for pixel controllers on the network. Splits the strip into DMX universes of up to 512
+# channels and keeps a preallocated packet for each one, with the pixels reordered straight into
+# the packet's data. Sends each universe that changed with a single sendmsg per frame. Every universe
+# gets sent again every so often even if nothing changed, since receivers treat a source that goes
+# quiet as lost. Subclasses fill in the protocol
+class Universe_Driver():
+    # ATTRIBUTES
+    # n (int): Number of pixels on the strip
+    # order (list of ints): Index in the RGBW frame of each channel in a pixel, in the order the controller expects
+    # universes (list of tuples): (start, stop, packet, pixels, message, address) for each universe, where start and
+    #                             stop are the range of the strip it carries, pixels is an (n, channels) view of the
+    #                             packet's data, and message is the list of buffers handed to sendmsg
+    # dirty (list of bools): Whether each universe has been updated since it was last sent
+    # sequence (int): Sequence number of the last frame sent
+    # last_refresh (float): Monotonic time that every universe was last sent
+    header_size = 0 # bytes before the data in a packet
+    sequence_offset = 0 # index in a packet of its sequence number
+    universe_size = 512 # channels in a universe
+    refresh_interval = 1 # seconds between sending every universe whether it changed or not
+    
+    # Constructor. pixel_order is a string like "GRBW" giving the channel order of the controller
+    def __init__(self, n, host, port, first_universe, pixel_order="RGBW"):
+        self.n = n
+        self.order = ["RGBW".index(channel) for channel in pixel_order]
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sequence = 0
+        self.last_refresh = 0
+        
+        # Build a packet for every universe, with as many whole pixels in each as fit
+        universe_pixels = self.universe_size // len(self.order)
+        self.universes = []
+        for start in range(0, n, universe_pixels):
+            stop = min(start + universe_pixels, n)
+            universe = first_universe + len(self.universes)
+            packet = bytearray(self.header_size + self.universe_size)
+            size = self.build_header(packet, universe, (stop - start) * len(self.order))
+            pixels = numpy.frombuffer(packet, dtype=numpy.uint8, count=(stop - start) * len(self.order),
+                                      offset=self.header_size).reshape(stop - start, len(self.order))
+            message = [memoryview(packet)[:size]]
+            self.universes.append((start, stop, packet, pixels, message, (self.destination(host, universe), port)))
+        self.dirty = [False] * len(self.universes)
+        
+    # Reorders the pixels from start to stop into the packets of the universes they're in
+    def update(self, frame, start, stop):
+        for index, (universe_start, universe_stop, packet, pixels, message, address) in enumerate(self.universes):
+            low = max(start, universe_start)
+            high = min(stop, universe_stop)
+            if low >= high:
+                continue
+            numpy.take(frame[low:high], self.order, axis=1, out=pixels[low - universe_start:high - universe_start])
+            self.dirty[index] = True
+            
+    # Sends the packet of every universe that was updated, or of every universe if it's time for a
+    # refresh, all with the next sequence number
+    def send(self):
+        now = time.monotonic()
+        if now - self.last_refresh >= self.refresh_interval:
+            for index in range(len(self.dirty)):
+                self.dirty[index] = True
+            self.last_refresh = now
+        self.sequence = self.next_sequence(self.sequence)
+        for index, (start, stop, packet, pixels, message, address) in enumerate(self.universes):
+            if self.dirty[index]:
+                packet[self.sequence_offset] = self.sequence
+                self.socket.sendmsg(message, (), 0, address)
+                self.dirty[index] = False
+                
+    # Sends every universe again if it's been too long since they were all sent, even though nothing changed
+    def refresh(self):
+        if time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.send()
+                
+    # Returns the host to send a universe to
+    def destination(self, host, universe):
+        return host
+        
+
+# Sends the strip to an Art-Net node as ArtDmx packets, starting from port address first_universe.
+# Send to a broadcast address to reach every node on the network
+class Art_Net_Driver(Universe_Driver):
+    header_size = Pixel_Protocols.artnet_header_size
+    sequence_offset = Pixel_Protocols.artnet_sequence_offset
+    
+    # Constructor
+    def __init__(self, n, host, first_universe=0, pixel_order="RGBW", port=Pixel_Protocols.artnet_port):
+        Universe_Driver.__init__(self, n, host, port, first_universe, pixel_order)
+        
+    # Writes the ArtDmx header of a universe into its packet and returns the length of the packet
+    def build_header(self, packet, universe, channels):
+        return Pixel_Protocols.build_artnet(packet, universe, 0, channels)
+        
+    # Art-Net sequence numbers go from 1 to 255, 0 means unnumbered
+    def next_sequence(self, sequence):
+        return sequence % 255 + 1
+        
+        
+# Sends the strip to an sACN (E1.31) receiver, starting from universe first_universe. If no host is
+# given, every universe is multicast to its group instead
+class SACN_Driver(Universe_Driver):
+    # ATTRIBUTES NOT INHERITED
+    # cid (bytes): Id that receivers tell this source apart from others by
+    header_size = Pixel_Protocols.e131_header_size
+    sequence_offset = Pixel_Protocols.e131_sequence_offset
+    source_name = b"window"
+    multicast_ttl = 1 # network hops multicast packets are allowed to take
+    
+    # Constructor
+    def __init__(self, n, host=None, first_universe=1, pixel_order="RGBW", port=Pixel_Protocols.e131_port):
+        self.cid = uuid.uuid4().bytes
+        Universe_Driver.__init__(self, n, host, port, first_universe, pixel_order)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.multicast_ttl)
+        
+    # Writes the E1.31 header of a universe into its packet and returns the length of the packet
+    def build_header(self, packet, universe, channels):
+        Pixel_Protocols.build_e131_header(packet, self.cid, self.source_name)
+        return Pixel_Protocols.build_e131(packet, universe, 0, channels)
+        
+    # E1.31 sequence numbers go from 0 to 255
+    def next_sequence(self, sequence):
+        return (sequence + 1) & 0xff
+        
+    # Multicast to the universe's group if there's no host
+    def destination(self, host, universe):
+        return Pixel_Protocols.e131_group(universe) if host is None else host
+
+        
+# Sends the strip as RGBW DDP packets, multicast by default so any number of followers on the network
+# can show it. Keeps a preallocated packet for every ddp_max_data bytes of the strip and sends the
+# ones that changed with a single sendmsg each, with the push flag on the last one so followers show
+# the frame once it's all there. Every packet gets sent again every so often, so followers that
+# missed one or joined late catch up
+class DDP_Driver():
+    # ATTRIBUTES
+    # n (int): Number of pixels on the strip
+    # chunks (list of tuples): (start, stop, packet, pixels, message) for each packet, where start and stop are the
+    #                          range of the strip it carries, pixels is an (n, 4) view of the packet's data, and message
+    #                          is the list of buffers handed to sendmsg
+    # dirty (list of bools): Whether each packet has been updated since it was last sent
+    # sequence (int): Sequence number of the last frame sent
+    # last_refresh (float): Monotonic time that every packet was last sent
+    chunk_pixels = Pixel_Protocols.ddp_max_data // 4
+    refresh_interval = 1 # seconds between sending every packet whether it changed or not
+    multicast_ttl = 1 # network hops multicast packets are allowed to take
+    
+    # Constructor
+    def __init__(self, n, host=Pixel_Protocols.ddp_group, port=Pixel_Protocols.ddp_port):
+        self.n = n
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.multicast_ttl)
+        self.sequence = 0
+        self.last_refresh = 0
+        
+        # Build a packet for every chunk of the strip
+        self.chunks = []
+        for start in range(0, n, self.chunk_pixels):
+            stop = min(start + self.chunk_pixels, n)
+            packet = bytearray(Pixel_Protocols.ddp_header.size + (stop - start) * 4)
+            size = Pixel_Protocols.build_ddp(packet, 0, start * 4, (stop - start) * 4, False)
+            pixels = numpy.frombuffer(packet, dtype=numpy.uint8, offset=Pixel_Protocols.ddp_header.size).reshape(stop - start, 4)
+            self.chunks.append((start, stop, packet, pixels, [memoryview(packet)[:size]]))
+        self.dirty = [False] * len(self.chunks)
+        
+    # Copies the pixels from start to stop into the packets they're in
+    def update(self, frame, start, stop):
+        for index, (chunk_start, chunk_stop, packet, pixels, message) in enumerate(self.chunks):
+            low = max(start, chunk_start)
+            high = min(stop, chunk_stop)
+            if low >= high:
+                continue
+            pixels[low - chunk_start:high - chunk_start] = frame[low:high]
+            self.dirty[index] = True
+            
+    # Sends every packet that was updated, or every packet if it's time for a refresh, all with the
+    # next sequence number and the push flag on the last one
+    def send(self):
+        now = time.monotonic()
+        if now - self.last_refresh >= self.refresh_interval:
+            self.dirty = [True] * len(self.chunks)
+            self.last_refresh = now
+        last = max(index for index, dirty in enumerate(self.dirty) if dirty) if any(self.dirty) else -1
+        self.sequence = self.sequence % 15 + 1
+        for index, (start, stop, packet, pixels, message) in enumerate(self.chunks):
+            if self.dirty[index]:
+                packet[0] = Pixel_Protocols.ddp_version | (Pixel_Protocols.ddp_push if index == last else 0)
+                packet[1] = self.sequence
+                self.socket.sendmsg(message, (), 0, self.address)
+                self.dirty[index] = False
+
+    # Sends every packet again if it's been too long since they were all sent, even though nothing changed
+    def refresh(self):
+        if time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.send()
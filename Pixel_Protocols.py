@@ -0,0 +1,119 @@
+import struct
+
+# Packet formats for streaming pixels over UDP. Parsing functions take a received packet and
+# return its fields without copying the pixel data, and building functions write a packet into a
+# preallocated buffer and return its length, so neither allocates per packet
+
+# DDP (Distributed Display Protocol). A 10 byte header, or 14 with a timecode, then raw pixel data
+# written at a byte offset into the display
+ddp_port = 4048
+ddp_header = struct.Struct(">BBBBIH") # flags, sequence, data type, destination, offset, length
+ddp_version = 0x40
+ddp_version_mask = 0xc0
+ddp_timecode = 0x10
+ddp_push = 0x01 # set on the last packet of a frame
+ddp_type_rgb = 0x0b # 8 bit RGB
+ddp_type_rgbw = 0x1b # 8 bit RGBW
+ddp_destination = 1 # the default output device
+ddp_max_data = 1440 # most data to put in one packet so it fits in an ethernet frame
+ddp_group = "239.255.40.48" # multicast group that a leader sends its frames to followers on
+
+# E1.31 (sACN). A 126 byte header that carries one universe of up to 512 DMX channels
+e131_port = 5568
+e131_header_size = 126
+e131_acn_id = b"ASC-E1.17\x00\x00\x00"
+e131_universe_size = 512
+e131_terminated = 0x40 # option set when the source stops sending
+e131_preview = 0x20 # option set when the data isn't meant for live output
+e131_sequence_offset = 111
+e131_options_offset = 112
+e131_universe_offset = 113
+
+# Art-Net. An 18 byte ArtDmx header that carries one universe of up to 512 DMX channels
+artnet_port = 6454
+artnet_header_size = 18
+artnet_id = b"Art-Net\x00"
+artnet_opcode_dmx = 0x5000
+artnet_version = 14
+artnet_sequence_offset = 12
+artnet_universe_size = 512
+
+# Takes a DDP packet and the number of bytes in it, and returns (sequence, offset, length, push,
+# data start, bytes per pixel), or None if it isn't a DDP data packet
+def parse_ddp(packet, size):
+    if size < ddp_header.size:
+        return None
+    flags, sequence, data_type, destination, offset, length = ddp_header.unpack_from(packet)
+    if flags & ddp_version_mask != ddp_version:
+        return None
+    start = ddp_header.size + (4 if flags & ddp_timecode else 0)
+    length = min(length, size - start)
+    if length <= 0:
+        return None
+    bytes_per_pixel = 4 if data_type == ddp_type_rgbw else 3
+    return sequence & 0x0f, offset, length, bool(flags & ddp_push), start, bytes_per_pixel
+
+# Writes a DDP header for length bytes of pixel data at offset into the start of buffer. The data
+# itself goes at ddp_header.size. Returns the length of the whole packet
+def build_ddp(buffer, sequence, offset, length, push, data_type=ddp_type_rgbw):
+    flags = ddp_version | (ddp_push if push else 0)
+    ddp_header.pack_into(buffer, 0, flags, sequence & 0x0f, data_type, ddp_destination, offset, length)
+    return ddp_header.size + length
+
+# Takes an E1.31 packet and the number of bytes in it, and returns (sequence, universe, options,
+# data start, number of channels), or None if it isn't an E1.31 data packet
+def parse_e131(packet, size):
+    if size <= e131_header_size or packet[4:16] != e131_acn_id:
+        return None
+    if packet[125] != 0: # start code, 0 for dimmer data
+        return None
+    sequence, options, universe = struct.unpack_from(">BBH", packet, e131_sequence_offset)
+    channels = min(struct.unpack_from(">H", packet, 123)[0] - 1, size - e131_header_size)
+    return sequence, universe, options, e131_header_size, channels
+
+# Writes the parts of an E1.31 header that never change for a source into the start of buffer.
+# cid is the 16 byte id of the source and name is its name, up to 63 bytes
+def build_e131_header(buffer, cid, name, priority=100):
+    buffer[:e131_header_size] = bytes(e131_header_size)
+    struct.pack_into(">HH12s", buffer, 0, 0x0010, 0, e131_acn_id)
+    struct.pack_into(">I16s", buffer, 18, 0x00000004, cid)
+    struct.pack_into(">I64sBHBBH", buffer, 40, 0x00000002, name[:63], priority, 0, 0, 0, 0)
+    struct.pack_into(">BBHH", buffer, 117, 0x02, 0xa1, 0, 1)
+
+# Fills in the parts of an E1.31 header in buffer that change from packet to packet, for a packet
+# carrying the number of channels given. The data itself goes at e131_header_size. Returns the
+# length of the whole packet
+def build_e131(buffer, universe, sequence, channels, options=0):
+    size = e131_header_size + channels
+    # Every layer starts with its length, with the top 4 bits set to 0x7
+    struct.pack_into(">H", buffer, 16, 0x7000 | (size - 16))
+    struct.pack_into(">H", buffer, 38, 0x7000 | (size - 38))
+    struct.pack_into(">H", buffer, 115, 0x7000 | (size - 115))
+    struct.pack_into(">BBH", buffer, e131_sequence_offset, sequence & 0xff, options, universe)
+    struct.pack_into(">HB", buffer, 123, channels + 1, 0)
+    return size
+
+# Writes an ArtDmx header for the number of channels given into the start of buffer. universe is the
+# 15 bit port address. The data goes at artnet_header_size, and the sequence number at
+# artnet_sequence_offset. Returns the length of the whole packet, which Art-Net needs to be even
+def build_artnet(buffer, universe, sequence, channels):
+    channels += channels % 2
+    struct.pack_into("<8sH", buffer, 0, artnet_id, artnet_opcode_dmx)
+    struct.pack_into(">HBBBBH", buffer, 10, artnet_version, sequence, 0, universe & 0xff, (universe >> 8) & 0x7f, channels)
+    return artnet_header_size + channels
+
+# Returns the multicast group that E1.31 sources send a universe to
+def e131_group(universe):
+    return "239.255.{}.{}".format(universe >> 8, universe & 0xff)
+
+# Takes the last sequence number accepted and a new one, both of the number of bits given, and
+# returns whether the new one is from an earlier packet that arrived late. A new number a long
+# way behind counts as the source starting over. If repeats is set, the same number twice counts as late
+def is_late(last, sequence, bits, window, repeats=True):
+    if last is None:
+        return False
+    half = 1 << (bits - 1)
+    difference = ((sequence - last + half) & ((1 << bits) - 1)) - half
+    if difference == 0:
+        return repeats
+    return -window < difference < 0
@@ -0,0 +1,81 @@
+import Modes
+import numpy
+from threading import Lock
+
+# Binary channel for pushing whole frames to the strip from a client. The TCP server receives each
+# frame straight into the back buffer of a Pixel_Slot and publishes it by swapping the buffers, and
+# the push mode copies the latest published frame into the strip when it renders. Frames that come in
+# faster than the strip shows them replace each other, so the client never waits on the strip
+class Pixel_Slot():
+    # ATTRIBUTES
+    # wakeup (Event): Set whenever a frame is published, so the LED strip shows it right away
+    # front (bytearray): Buffer holding the latest published frame
+    # back (bytearray): Buffer the next frame gets received into
+    # length (int): Bytes of pixel data in the front buffer
+    # fresh (bool): Whether the front buffer holds a frame that hasn't been taken yet
+    # published (int): Number of frames published
+    # taken (int): Number of frames taken
+    
+    # Constructor
+    def __init__(self, wakeup):
+        self.wakeup = wakeup
+        self.lock = Lock()
+        self.front = bytearray()
+        self.back = bytearray()
+        self.length = 0
+        self.fresh = False
+        self.published = 0
+        self.taken = 0
+    
+    # Returns a writable view of length bytes of the back buffer to receive the next frame into. Only
+    # allocates when a frame is bigger than any before it
+    def reserve(self, length):
+        if len(self.back) < length:
+            self.back = bytearray(length)
+        return memoryview(self.back)[:length]
+    
+    # Makes the frame that was just received into the back buffer the latest one, and wakes up the strip
+    def publish(self, length):
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.length = length
+            self.fresh = True
+            self.published += 1
+        self.wakeup.set()
+    
+    # Copies the latest frame into an (n, 4) array of pixels if it hasn't been taken yet. A frame
+    # shorter than the strip leaves the rest of it alone. Returns whether there was a frame to take
+    def take(self, pixels):
+        with self.lock:
+            if not self.fresh:
+                return False
+            flat = pixels.reshape(-1)
+            length = min(self.length, len(flat))
+            flat[:length] = numpy.frombuffer(self.front, dtype=numpy.uint8, count=length)
+            self.fresh = False
+            self.taken += 1
+        return True
+    
+    # Starts counting frames from 0 again
+    def reset_counts(self):
+        with self.lock:
+            self.published = 0
+            self.taken = 0
+
+
+# Mode that shows frames pushed through a Pixel_Slot, holding the last one until the next arrives.
+# The LED strip renders it as soon as a frame is published instead of waiting for the next frame time
+class Push_Mode(Modes.Mode):
+    # ATTRIBUTES NOT INHERITED
+    # slot (Pixel_Slot): Where pushed frames are taken from
+    name = "push"
+    render_ahead = False # frames come from the client as they arrive
+    hold_time = 1 # seconds to wait for the next frame before checking again
+    
+    # Constructor
+    def __init__(self, slot):
+        self.slot = slot
+    
+    def cycle(self, leds):
+        self.slot.take(leds.pixels)
+        yield self.hold_time
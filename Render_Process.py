@@ -0,0 +1,266 @@
+from LED_Strip import LED_Strip, Command_Queue, make_frame_buffer
+import numpy
+import multiprocessing
+from multiprocessing import shared_memory
+from threading import Thread, Event
+import logging
+from logging import handlers
+import os
+import queue
+
+# Start the renderer from a fresh interpreter instead of forking it, so it doesn't inherit the
+# sockets, pigpio connection and log file that this process has open
+context = multiprocessing.get_context("spawn")
+
+# Stands in for LED_Strip when LED_Strip.render_process is set. Modes render in a separate
+# process so they get a core of their own, away from the remote, button and TCP threads. Commands
+# go to the renderer over a pipe, and every rendered frame comes back through shared memory to be
+# transmitted to the strip from this process, and so do its log records. This thread forwards
+# commands to the renderer
+class Render_Process(Thread):
+    # ATTRIBUTES
+    # leds (Frame_Buffer): Transfers frames to the strip
+    # shared_frame (Shared_Frame): Frame that the renderer publishes into
+    # connection (Connection): This end of the pipe to the renderer
+    # process (Process): The renderer
+    # output (Render_Output): Thread that transmits the frames the renderer publishes
+    # log_listener (QueueListener): Thread that logs the records the renderer sends
+    wait_time = 1 # seconds
+    cpu = None # core to run the renderer on, None to let the OS choose
+
+    # Constructor
+    def __init__(self, stop_event, to_tcp_server, to_led_strip):
+        # Set up logger object
+        self.logger = logging.getLogger(__name__)
+
+        # Initialize the strip and the frame the renderer publishes into
+        self.leds = make_frame_buffer(LED_Strip.outputs)
+        self.shared_frame = Shared_Frame(self.leds.n, context.Lock())
+
+        # Log what the renderer logs as if it were logged here
+        log_queue = context.Queue()
+        self.log_listener = logging.handlers.QueueListener(log_queue, Log_Forwarder())
+        self.log_listener.start()
+
+        # Start the renderer, then the thread that transmits its frames
+        self.connection, renderer_connection = context.Pipe()
+        self.process = context.Process(
+            target = render_main,
+            args = (renderer_connection, self.shared_frame, log_queue, logging.getLogger().level, self.cpu),
+            name = "Renderer",
+            daemon = True
+        )
+        self.process.start()
+        renderer_connection.close()
+        self.output = Render_Output(stop_event, to_tcp_server, self.connection, self.shared_frame, self.leds)
+
+        # Initialize queues
+        self.to_led_strip = to_led_strip
+
+        # Initialize thread
+        Thread.__init__(self, name="Render Process")
+        self.stop_event = stop_event
+        Thread.start(self)
+
+    # Run method
+    def run(self):
+        try:
+            # Forward every message to the renderer
+            while not self.stop_event.is_set():
+                try:
+                    self.connection.send(self.to_led_strip.get(timeout=self.wait_time))
+                except queue.Empty:
+                    pass
+
+        # Catch stray errors
+        except Exception:
+            self.logger.exception("Encountered uncaught exception")
+            self.stop_event.set()
+
+        # Tell the renderer to stop, then clean up after it
+        finally:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(self.wait_time * 5)
+            if self.process.is_alive():
+                self.logger.warning("Renderer didn't stop, terminating it")
+                self.process.terminate()
+            self.output.join()
+            self.log_listener.stop()
+            self.shared_frame.close()
+            self.shared_frame.unlink()
+
+
+# Log handler that passes records from the renderer on to the logger of the same name in this
+# process, so they end up wherever this process's own records do
+class Log_Forwarder(logging.Handler):
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+# Thread that receives from the renderer. Passes replies on to the TCP server, and transmits the
+# newest frame in shared memory whenever the renderer says it published one. Frames that were
+# replaced before they could be transmitted are dropped
+class Render_Output(Thread):
+    # ATTRIBUTES
+    # frame (numpy array): Copy of the newest frame that's being transmitted
+    # transmitted (int): Number of frames transmitted
+    # dropped (int): Number of frames replaced before they were transmitted
+    wait_time = 1 # seconds
+
+    # Constructor
+    def __init__(self, stop_event, to_tcp_server, connection, shared_frame, frame_buffer):
+        # Set up logger object
+        self.logger = logging.getLogger(__name__)
+
+        # Initialize attributes
+        self.connection = connection
+        self.shared_frame = shared_frame
+        self.frame_buffer = frame_buffer
+        self.frame = numpy.zeros_like(frame_buffer.pixels)
+        self.transmitted = 0
+        self.dropped = 0
+        self.to_tcp_server = to_tcp_server
+
+        # Initialize thread
+        Thread.__init__(self, name="Render Output")
+        self.stop_event = stop_event
+        Thread.start(self)
+
+    # Run method. Keeps receiving until the renderer closes its end of the pipe, so the renderer
+    # never gets stuck sending while it's trying to stop
+    def run(self):
+        while True:
+            try:
+                # Wait for the renderer, then handle everything it sent
+                if not self.connection.poll(self.wait_time):
+                    continue
+                frames = 0
+                while self.connection.poll():
+                    item = self.connection.recv()
+                    if item is None:
+                        frames += 1
+                    else:
+                        self.to_tcp_server.put_nowait(item)
+
+                # Transmit only the newest frame
+                if frames > 0 and not self.stop_event.is_set():
+                    self.dropped += frames - 1
+                    self.shared_frame.read(self.frame)
+                    self.frame_buffer.transmit(self.frame)
+                    self.transmitted += 1
+
+            # The renderer stopped
+            except (EOFError, OSError):
+                if not self.stop_event.is_set():
+                    self.logger.error("Renderer exited")
+                    self.stop_event.set()
+                return
+
+            # Catch stray errors
+            except Exception:
+                self.logger.exception("Encountered uncaught exception")
+                self.stop_event.set()
+
+
+# RGBW frame in shared memory that the renderer writes and the main process reads. The lock
+# makes sure a frame is never read while it's half written
+class Shared_Frame():
+    # ATTRIBUTES
+    # n (int): Number of pixels in the frame
+    # lock (Lock): Lock shared by both processes, held while the frame is copied in or out
+    # memory (SharedMemory): The shared memory block, attached again in every process that uses it
+    # pixels (numpy array): (n, 4) uint8 view of the shared memory
+
+    # Constructor. Creates the shared memory block
+    def __init__(self, n, lock):
+        self.n = n
+        self.lock = lock
+        self.memory = shared_memory.SharedMemory(create=True, size=n * 4)
+        self.pixels = numpy.ndarray((n, 4), dtype=numpy.uint8, buffer=self.memory.buf)
+        self.pixels[:] = 0
+
+    # Only the name of the block gets sent to another process, which attaches to it by name
+    def __getstate__(self):
+        return {"n" : self.n, "lock" : self.lock, "name" : self.memory.name}
+
+    def __setstate__(self, state):
+        self.n = state["n"]
+        self.lock = state["lock"]
+        self.memory = shared_memory.SharedMemory(name=state["name"])
+        self.pixels = numpy.ndarray((self.n, 4), dtype=numpy.uint8, buffer=self.memory.buf)
+
+    # Copies a frame in
+    def write(self, pixels):
+        with self.lock:
+            self.pixels[:] = pixels
+
+    # Copies the frame out
+    def read(self, out):
+        with self.lock:
+            out[:] = self.pixels
+
+    # Detaches from the shared memory block
+    def close(self):
+        self.pixels = None
+        self.memory.close()
+
+    # Frees the shared memory block once every process has detached from it
+    def unlink(self):
+        self.memory.unlink()
+
+
+# The renderer's end of the pipe. Takes the place of the LED strip's output stage, publishing
+# frames to the shared frame, and of the queue that replies go on
+class Render_Link():
+    # ATTRIBUTES
+    # n (int): Number of pixels in a frame
+    depth = 0 # frames are published as soon as they're rendered, without rendering ahead
+
+    # Constructor
+    def __init__(self, connection, shared_frame):
+        self.connection = connection
+        self.shared_frame = shared_frame
+        self.n = shared_frame.n
+
+    # Publishes a frame and lets the main process know it's there
+    def submit(self, pixels):
+        self.shared_frame.write(pixels)
+        self.connection.send(None)
+
+    # Sends a reply to the main process
+    def put_nowait(self, item):
+        self.connection.send(item)
+
+
+# Entry point of the renderer. Runs an LED strip that renders into the shared frame and receives
+# messages from the pipe until the main process sends None or goes away. Log records go to the
+# main process on log_queue, and only the ones at level or above get sent
+def render_main(connection, shared_frame, log_queue, level, cpu=None):
+    root_logger = logging.getLogger()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level)
+    logger = logging.getLogger(__name__)
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    stop_event = Event()
+    to_led_strip = Command_Queue(push=False)
+    link = Render_Link(connection, shared_frame)
+    led_strip = LED_Strip(stop_event, link, to_led_strip, output=link)
+    try:
+        while not stop_event.is_set():
+            if not connection.poll(Render_Process.wait_time):
+                continue
+            message = connection.recv()
+            if message is None:
+                break
+            to_led_strip.put_nowait(message)
+    except (EOFError, OSError):
+        logger.warning("Lost connection to the main process")
+    finally:
+        stop_event.set()
+        led_strip.join()
+        connection.close()
+        shared_frame.close()
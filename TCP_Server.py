@@ -1,5 +1,7 @@
 from LED_Strip import LED_Strip
 import Modes
+import Compositor
+import Transition
 import time
 import os
 import sys
@@ -10,6 +12,7 @@ import subprocess
 import calendar
 import re
 import queue
+import struct
 
 # Class that encapsulates a TCP server and remote interface
 class TCP_Server(Thread):
@@ -20,6 +23,11 @@ class TCP_Server(Thread):
     # buf_size (int): The maximum number of bytes to receive from the client
     # socket_timeout (int): Number of seconds before timing out on blocking socket operations
     # logger (Logger): Object that writes to the log file
+    # pixel_slot (Pixel_Slot): Where frames pushed by the client go, None if the LED strip can't take them
+    # pushing (bool): Set when the client switches its connection over to pushing frames
+    # frame_header (bytearray): Buffer that the length in front of each pushed frame is received into
+    frame_format = struct.Struct(">I") # length of a pushed frame in bytes
+    max_frame_size = 4 * 65536 # largest pushed frame to accept, in bytes
     
     # Constructor. Sets up server to be run
     def __init__(self, stop_event, to_tcp_server, to_led_strip, to_alarm_clock, to_th_sensor):
@@ -34,6 +42,7 @@ class TCP_Server(Thread):
             "snooze"    : self.command_snooze,
             "restart"   : self.command_restart,
             "reboot"    : self.command_reboot,
+            "push"      : self.command_push,
         }
         self.macros = {
             "r?g?b?w?" : self.macro_rgbw,
@@ -54,6 +63,11 @@ class TCP_Server(Thread):
         self.to_led_strip = to_led_strip
         self.to_alarm_clock = to_alarm_clock
         self.to_th_sensor = to_th_sensor
+        
+        # Initialize the binary channel for pushing frames
+        self.pixel_slot = getattr(to_led_strip, "pixel_slot", None)
+        self.pushing = False
+        self.frame_header = bytearray(self.frame_format.size)
 
         # Initialize thread
         Thread.__init__(self, name="TCP Server")
@@ -105,6 +119,11 @@ class TCP_Server(Thread):
                     conn.sendall((reply + "\n").encode("utf-8"))
                     self.logger.debug("Sent reply " + reply)
                     
+                    # Take frames instead of commands once the client starts pushing them
+                    if self.pushing:
+                        self.pushing = False
+                        client_connected = self.receive_frames(conn)
+                    
                 except socket.timeout:
                     client_connected = False
                     self.logger.warning("Timed out waiting for command. Disconnecting")
@@ -112,6 +131,31 @@ class TCP_Server(Thread):
                     client_connected = False
                     self.logger.warning("Client forcibly closed connection. Disconnecting")
 
+    # Receives frames pushed by the client and hands them to the LED strip without replying. Each frame is
+    # a 4 byte big-endian length followed by that many bytes of RGBW pixels. A length of 0 goes back to
+    # commands, with a reply saying how many frames came in. Returns whether the client is still connected
+    def receive_frames(self, conn):
+        header = memoryview(self.frame_header)
+        while not self.stop_event.is_set():
+            if not receive_exactly(conn, header):
+                self.logger.info("Client ended connection while pushing frames")
+                return False
+            length = self.frame_format.unpack(self.frame_header)[0]
+            if length == 0:
+                break
+            if length > self.max_frame_size:
+                self.logger.warning("Client pushed a {} byte frame. Disconnecting".format(length))
+                return False
+            if not receive_exactly(conn, self.pixel_slot.reserve(length)):
+                self.logger.info("Client ended connection while pushing frames")
+                return False
+            self.pixel_slot.publish(length)
+        
+        reply = "Received {} frames, showed {}".format(self.pixel_slot.published, self.pixel_slot.taken)
+        conn.sendall((reply + "\n").encode("utf-8"))
+        self.logger.debug("Sent reply " + reply)
+        return True
+
     # Take command, return reply
     def parse_command(self, command):
         # Parse command
@@ -161,6 +205,10 @@ class TCP_Server(Thread):
                 
         reply += "================================ MODES ==================================\n"                
         reply += Modes.mode_string(format_string)
+        for arg, description in Compositor.Compositor.arg_dict.items():
+            reply += format_string.format("layer", arg, description)
+        for arg, description in Transition.Transition.arg_dict.items():
+            reply += format_string.format("transition", arg, description)
         return reply
         
 
@@ -220,6 +268,26 @@ class TCP_Server(Thread):
         
         return reply
 
+    # Returns reply for the push command
+    def command_push(self, command):
+        # If the argument is none then return the arg dict
+        if command is None:
+            return {
+                "none" : "push frames over this connection: a 4 byte big-endian length, then that many bytes of RGBW, 0 to stop",
+            }
+            
+        if self.pixel_slot is None:
+            return "Pushing frames isn't available"
+        
+        # Pass the command to the LED strip, and start taking frames if it's ready for them
+        self.to_led_strip.put_nowait(["TCP_Server", command])
+        try:
+            reply = self.to_tcp_server.get(True, self.conn_timeout / 2)[1]
+        except queue.Empty:
+            return "Timed out waiting for the LED strip to respond"
+        self.pushing = reply == "Pushing frames"
+        return reply
+
     # Returns reply for the restart command
     def command_restart(self, command):
         # If the argument is none then return the arg dict
@@ -288,4 +356,13 @@ class TCP_Server(Thread):
         for intensity in args:
             command += " " + intensity
         return command
-                
\ No newline at end of file
+                
+# Receives from a connection until view is full. Returns False if the connection closed first
+def receive_exactly(conn, view):
+    received = 0
+    while received < len(view):
+        size = conn.recv_into(view[received:])
+        if size == 0:
+            return False
+        received += size
+    return True
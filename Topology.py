@@ -0,0 +1,53 @@
+# Maps one logical canvas of pixels onto several physical outputs, each with its own output
+# driver. Works as an output driver itself, so a Frame_Buffer can render the whole canvas as one
+# frame. Each range of the frame is handed to the drivers it covers as a slice, so the cost per
+# frame grows with the number of outputs rather than the number of pixels. Passes refreshes on to
+# the drivers that have to keep sending when nothing changes, including when other outputs changed
+class Topology():
+    # ATTRIBUTES
+    # n (int): Number of pixels on the whole canvas
+    # segments (list of tuples): (start, stop, driver, reverse) for each output, where start and stop
+    #                            are the range of the canvas it shows and reverse means it's wired backwards
+    # dirty (list of bools): Whether each output has been updated since it was last sent
+    # refreshes (list of functions): Refresh hook of each output's driver, None if it doesn't have one
+    
+    # Constructor. Takes a list of (driver, reverse) pairs in the order they appear on the canvas
+    def __init__(self, outputs):
+        self.segments = []
+        start = 0
+        for driver, reverse in outputs:
+            self.segments.append((start, start + driver.n, driver, reverse))
+            start += driver.n
+        self.n = start
+        self.dirty = [False] * len(self.segments)
+        self.refreshes = [getattr(driver, "refresh", None) for driver, reverse in outputs]
+        
+    # Hands the part of the canvas from start to stop to the drivers of the outputs it covers
+    def update(self, frame, start, stop):
+        for index, (segment_start, segment_stop, driver, reverse) in enumerate(self.segments):
+            # Skip outputs that don't overlap the range
+            low = max(start, segment_start)
+            high = min(stop, segment_stop)
+            if low >= high:
+                continue
+            # Reversed outputs get a reversed view of their part of the canvas
+            if reverse:
+                driver.update(frame[segment_start:segment_stop][::-1], segment_stop - high, segment_stop - low)
+            else:
+                driver.update(frame[segment_start:segment_stop], low - segment_start, high - segment_start)
+            self.dirty[index] = True
+            
+    # Sends every output that was updated, and lets the others resend if they have to and it's due
+    def send(self):
+        for index, (segment_start, segment_stop, driver, reverse) in enumerate(self.segments):
+            if self.dirty[index]:
+                driver.send()
+                self.dirty[index] = False
+            elif self.refreshes[index] is not None:
+                self.refreshes[index]()
+
+    # Lets every driver that has to keep sending resend if it's due
+    def refresh(self):
+        for refresh in self.refreshes:
+            if refresh is not None:
+                refresh()
@@ -0,0 +1,72 @@
+import Modes
+from Compositor import Layer, blend_frames
+import numpy
+import time
+
+# Mode that crossfades from one mode to another. Both modes keep rendering on their own
+# schedules while the incoming mode is blended in over the outgoing one along an easing curve.
+# Once the fade is over, both modes are stopped and the cycle ends, so the LED strip can take the
+# incoming mode over at the start of a fresh cycle
+class Transition(Modes.Mode):
+    # ATTRIBUTES NOT INHERITED
+    # outgoing (Layer): Layer running the mode being faded out
+    # incoming (Layer): Layer running the mode being faded in
+    # duration (float): Seconds the crossfade takes
+    # start (float): Monotonic time that the crossfade started at
+    name = "transition"
+    render_ahead = False # the blend comes from the time the frame is rendered at
+    arg_dict = {"seconds" : "Crossfade between modes for the number of seconds given, 0 to switch instantly"}
+    fade_frame_time = .02 # longest time to show one blended frame for, so the fade stays smooth
+    
+    # Constructor
+    def __init__(self, outgoing_mode, incoming_mode, duration):
+        self.outgoing = Layer("outgoing", outgoing_mode)
+        self.incoming = Layer("incoming", incoming_mode)
+        self.duration = duration
+        self.start = time.monotonic()
+        self.wide = None
+        
+    def cycle(self, leds):
+        # Make sure the layers and blending buffer match the canvas
+        self.outgoing.resize(leds.n)
+        self.incoming.resize(leds.n)
+        if self.wide is None or self.wide.shape[1] != leds.n:
+            self.wide = numpy.zeros((2, leds.n, 4), dtype=numpy.uint16)
+            
+        # Blend the two modes until the crossfade is over. A layer with no deadline has nothing to
+        # show, like a mode on too few LEDs to render anything, so only the other one sets the pace
+        now = time.monotonic()
+        try:
+            while not self.is_done(now):
+                self.outgoing.advance(now)
+                self.incoming.advance(now)
+                blend_frames(self.outgoing.frame.pixels, self.incoming.frame.pixels, ease(self.progress(now)), leds.pixels, self.wide)
+                deadline = now + self.fade_frame_time
+                if self.outgoing.deadline is not None:
+                    deadline = min(deadline, self.outgoing.deadline)
+                if self.incoming.deadline is not None:
+                    deadline = min(deadline, self.incoming.deadline)
+                yield max(deadline - time.monotonic(), 0)
+                now = time.monotonic()
+        # Stop both modes, whether the crossfade is over or the LED strip moved on before it was
+        finally:
+            self.outgoing.close()
+            self.incoming.close()
+            
+    # Returns how far through the crossfade it is, from 0 to 1
+    def progress(self, now):
+        if self.duration <= 0:
+            return 1
+        return min(max((now - self.start) / self.duration, 0), 1)
+        
+    # Returns whether the crossfade is over
+    def is_done(self, now=None):
+        return self.progress(time.monotonic() if now is None else now) >= 1
+        
+    # Modifications apply to the incoming mode
+    def modify(self, args, count=1):
+        return self.incoming.mode.modify(args, count)
+        
+# Easing curve that starts and ends the crossfade gently. Takes and returns a number from 0 to 1
+def ease(progress):
+    return progress * progress * (3 - 2 * progress)
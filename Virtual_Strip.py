@@ -0,0 +1,76 @@
+# In-memory stand-in for neopixel.NeoPixel with auto_write off. Has the same n, item and
+# slice assignment, fill and show surface so modes can run without a physical strip
+class Virtual_Strip():
+    # ATTRIBUTES
+    # n (int): Number of pixels on the strip
+    # bpp (int): Bytes per pixel
+    # buf (bytearray): The pixel bytes in RGBW order
+    # shows (int): Number of times show() has been called
+    # frame (bytes): Copy of buf taken on the last call to show()
+    
+    # Constructor
+    def __init__(self, n, bpp=4):
+        self.n = n
+        self.bpp = bpp
+        self.buf = bytearray(n * bpp)
+        self.shows = 0
+        self.frame = bytes(self.buf)
+        
+    def __len__(self):
+        return self.n
+        
+    # Sets one pixel or a slice of pixels. Colors are validated the same way the NeoPixel library does
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            indices = range(*index.indices(self.n))
+            if len(value) != len(indices):
+                raise ValueError("Slice and input sequence size do not match")
+            for i, color in zip(indices, value):
+                self.set_pixel(i, color)
+        else:
+            if index < 0:
+                index += self.n
+            if not 0 <= index < self.n:
+                raise IndexError("Pixel index out of range")
+            self.set_pixel(index, value)
+            
+    # Returns one pixel as a tuple or a slice of pixels as a list of tuples
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_pixel(i) for i in range(*index.indices(self.n))]
+        if index < 0:
+            index += self.n
+        if not 0 <= index < self.n:
+            raise IndexError("Pixel index out of range")
+        return self.get_pixel(index)
+        
+    # Sets every pixel to one color
+    def fill(self, color):
+        for i in range(self.n):
+            self.set_pixel(i, color)
+            
+    # Latches the current pixels as the displayed frame
+    def show(self):
+        self.frame = bytes(self.buf)
+        self.shows += 1
+        
+    # Latches raw bytes as the displayed frame, like neopixel_write does for a real strip. Can be
+    # used as the transport for a Byte_Driver
+    def transmit(self, buffer):
+        self.buf[:] = buffer
+        self.show()
+        
+    # Writes a color tuple into the buffer
+    def set_pixel(self, index, color):
+        if len(color) != self.bpp:
+            raise ValueError("Expected a color with {} values".format(self.bpp))
+        for value in color:
+            if not 0 <= value <= 255:
+                raise ValueError("Color values must be between 0 and 255 inclusive")
+        offset = index * self.bpp
+        self.buf[offset:offset + self.bpp] = bytes(color)
+        
+    # Reads a color tuple out of the buffer
+    def get_pixel(self, index):
+        offset = index * self.bpp
+        return tuple(self.buf[offset:offset + self.bpp])
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+# Measures how fast every mode renders on a virtual strip, without waiting between frames
+# Usage: python3 benchmark.py [frames] [strip lengths...]
+
+from Virtual_Strip import Virtual_Strip
+from Frame_Buffer import Frame_Buffer
+from Output_Driver import NeoPixel_Driver, Byte_Driver, Reference_Driver, Art_Net_Driver, SACN_Driver, DDP_Driver
+from Topology import Topology
+from Allocation_Counter import Allocation_Counter
+import Modes
+import numpy
+import sys
+import time
+import tracemalloc
+
+# Arguments to construct the modes that need them
+mode_args = {
+    "alarm" : ["1200"],
+    "color" : ["255", "0", "0", "255"],
+}
+# Modes that show pixels received over the network instead of rendering them, so there's nothing to time
+network_modes = ["stream", "follow"]
+default_frames = 1000
+default_lengths = [30, 300, 1000, 5000]
+topology_outputs = 4 # number of strips the canvas is split across for the topology driver
+network_host = "127.0.0.1" # host that the network drivers send packets to
+
+# Functions that take a strip length and return an output driver for a virtual strip
+drivers = {
+    "neopixel" : lambda n: NeoPixel_Driver(Virtual_Strip(n)),
+    "bytes" : lambda n: Byte_Driver(n, Virtual_Strip(n).transmit),
+    "topology" : lambda n: make_topology(n, topology_outputs),
+    "artnet" : lambda n: Art_Net_Driver(n, network_host),
+    "sacn" : lambda n: SACN_Driver(n, network_host),
+    "ddp" : lambda n: DDP_Driver(n, network_host),
+}
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else default_frames
+    lengths = [int(arg) for arg in sys.argv[2:]] if len(sys.argv) > 2 else default_lengths
+    
+    # Make sure the vectorized driver writes the same bytes as the reference one before timing it
+    for n in lengths:
+        for pixel_order in ("GRBW", "RGBW", "BGR"):
+            if not check_byte_driver(n, pixel_order):
+                print("Byte_Driver doesn't match Reference_Driver for {} {} pixels".format(n, pixel_order))
+                sys.exit(1)
+    
+    format_string = "{:<10}{:<10}{:>8}{:>12}{:>14}{:>14}{:>16}{:>14}\n"
+    report = format_string.format("Mode", "Driver", "LEDs", "Frames/s", "Render (us)", "Show (us)", "Max peak (B)", "Avg peak (B)")
+    for n in lengths:
+        for name, mode_class in Modes.class_dict.items():
+            if name in network_modes:
+                continue
+            for driver_name, make_driver in drivers.items():
+                fps, render_time, show_time = time_mode(mode_class, make_driver(n), frames)
+                peak, allocated = measure_allocations(mode_class, make_driver(n), min(frames, 100))
+                report += format_string.format(name, driver_name, n, "{:.0f}".format(fps), "{:.1f}".format(render_time * 1e6),
+                                               "{:.1f}".format(show_time * 1e6), "{:.0f}".format(peak), "{:.1f}".format(allocated))
+    print(report, end="")
+    
+# Returns whether Byte_Driver and Reference_Driver send the same bytes for random frames of n pixels,
+# both when the whole frame is updated and when only part of it is
+def check_byte_driver(n, pixel_order):
+    sent = []
+    byte_driver = Byte_Driver(n, lambda buffer: sent.append(bytes(buffer)), pixel_order)
+    reference_driver = Reference_Driver(n, lambda buffer: sent.append(bytes(buffer)), pixel_order)
+    for start, stop in ((0, n), (n // 3, n - n // 3)):
+        frame = numpy.random.randint(0, 256, (n, 4), dtype=numpy.uint8)
+        for driver in (byte_driver, reference_driver):
+            driver.update(frame, start, stop)
+            driver.send()
+        if sent[-1] != sent[-2]:
+            return False
+    return True
+    
+# Returns a topology that splits n pixels across the number of virtual strips given, with every
+# other strip wired in reverse
+def make_topology(n, outputs):
+    lengths = [n // outputs + (1 if i < n % outputs else 0) for i in range(outputs)]
+    return Topology([(Byte_Driver(length, Virtual_Strip(length).transmit), i % 2 == 1) for i, length in enumerate(lengths)])
+    
+# Returns a new mode instance of the class given
+def make_mode(mode_class):
+    return mode_class(list(mode_args.get(mode_class.name, [])))
+    
+# Renders the number of frames given from a mode, starting new cycles as needed. If show is set,
+# shows every frame. If an allocation counter is given, measures every frame's peak allocation.
+# Returns the total time spent rendering and the total time spent showing
+def run_frames(mode, leds, frames, show=True, counter=None):
+    render_time = 0
+    show_time = 0
+    cycle = mode.cycle(leds)
+    rendered = 0
+    while rendered < frames:
+        start = time.perf_counter()
+        if counter is not None:
+            counter.start()
+        try:
+            next(cycle)
+        except StopIteration:
+            cycle = mode.cycle(leds)
+            continue
+        rendered_at = time.perf_counter()
+        if show:
+            leds.show()
+        if counter is not None:
+            counter.stop()
+        render_time += rendered_at - start
+        show_time += time.perf_counter() - rendered_at
+        rendered += 1
+    return render_time, show_time
+    
+# Returns the frames per second, render time per frame and show time per frame of a mode
+def time_mode(mode_class, driver, frames):
+    leds = Frame_Buffer(driver)
+    render_time, show_time = run_frames(make_mode(mode_class), leds, frames)
+    return frames / (render_time + show_time), render_time / frames, show_time / frames
+    
+# Returns the most bytes that rendering and showing one frame of a mode had allocated at once, and
+# the average of that peak over the frames. Temporary objects count toward the peak, but memory that
+# gets freed and allocated again within a frame only counts once
+def measure_allocations(mode_class, driver, frames):
+    leds = Frame_Buffer(driver)
+    mode = make_mode(mode_class)
+    run_frames(mode, leds, 1)
+    counter = Allocation_Counter()
+    tracemalloc.start()
+    run_frames(mode, leds, frames, counter=counter)
+    tracemalloc.stop()
+    return counter.peak, counter.per_frame()
+    
+    
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+# Pushes frames to the TCP server's binary channel as fast as it takes them, and measures the
+# throughput for each strip length. Frames are a scrolling rainbow
+# Usage: python3 push_sender.py [host] [seconds] [pixels...]
+
+from Modes import wheel_table
+import numpy
+import socket
+import struct
+import sys
+import time
+
+default_host = "127.0.0.1"
+port = 12345
+default_seconds = 5
+default_lengths = [30, 300, 1000, 5000]
+frame_format = struct.Struct(">I")
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else default_host
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else default_seconds
+    lengths = [int(arg) for arg in sys.argv[3:]] if len(sys.argv) > 3 else default_lengths
+    
+    format_string = "{:<10}{:>12}{:>12}{:>12}  {}"
+    print(format_string.format("Pixels", "Frames/s", "MB/s", "us/frame", "Server"))
+    with socket.create_connection((host, port)) as connection:
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for n in lengths:
+            # Switch the connection over to frames, and wait until the server is ready for them
+            connection.sendall(b"push")
+            reply = receive_reply(connection)
+            if reply != "Pushing frames":
+                print("Server won't take frames: " + reply)
+                return
+            
+            # Send frames for the whole time, each one a length and then the pixels
+            frames = numpy.zeros((256, frame_format.size + n * 4), dtype=numpy.uint8)
+            positions = numpy.arange(n) * 256 // n
+            for step in range(256):
+                frame_format.pack_into(frames[step], 0, n * 4)
+                frames[step, frame_format.size:] = wheel_table[(positions + step) & 255].reshape(-1)
+            count = 0
+            start = time.monotonic()
+            while time.monotonic() - start < seconds:
+                connection.sendall(frames[count & 255])
+                count += 1
+            
+            # Stop pushing, which waits for the server to take every frame that was sent
+            connection.sendall(frame_format.pack(0))
+            reply = receive_reply(connection)
+            elapsed = time.monotonic() - start
+            print(format_string.format(n, "{:.0f}".format(count / elapsed), "{:.1f}".format(count * n * 4 / elapsed / 1e6),
+                                       "{:.1f}".format(elapsed / count * 1e6), reply))
+
+# Returns the next line the server replies with
+def receive_reply(connection):
+    reply = b""
+    while not reply.endswith(b"\n"):
+        received = connection.recv(65536)
+        if received == b"":
+            break
+        reply += received
+    return reply.decode("utf-8").strip()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+# Streams a scrolling rainbow to the stream mode over UDP, for testing without a visualizer
+# Usage: python3 stream_sender.py [ddp|e131] [host] [pixels] [frames per second] [seconds]
+
+import Pixel_Protocols
+from Modes import wheel_table
+import numpy
+import socket
+import sys
+import time
+import uuid
+
+default_protocol = "ddp"
+default_host = "127.0.0.1"
+default_pixels = 30
+default_fps = 60
+default_seconds = 10
+universe = 1 # first E1.31 universe
+
+def main():
+    protocol = sys.argv[1] if len(sys.argv) > 1 else default_protocol
+    host = sys.argv[2] if len(sys.argv) > 2 else default_host
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else default_pixels
+    fps = float(sys.argv[4]) if len(sys.argv) > 4 else default_fps
+    seconds = float(sys.argv[5]) if len(sys.argv) > 5 else default_seconds
+    if protocol == "ddp":
+        sender = DDP_Sender(host, n)
+    elif protocol == "e131":
+        sender = E131_Sender(host, n)
+    else:
+        print("Protocol must be ddp or e131")
+        return
+    
+    # Send one frame per period, scrolling the rainbow one step every frame
+    positions = numpy.arange(n) * 256 // n
+    frames = int(seconds * fps)
+    start = time.monotonic()
+    for frame in range(frames):
+        sender.send(wheel_table[(positions + frame) & 255])
+        time.sleep(max(start + (frame + 1) / fps - time.monotonic(), 0))
+    print("Sent {} frames of {} pixels in {} packets at {:.1f} frames/s".format(
+        frames, n, sender.packets, frames / (time.monotonic() - start)))
+
+# Sends frames as DDP packets of up to ddp_max_data bytes each, pushing on the last one
+class DDP_Sender():
+    # Constructor
+    def __init__(self, host, n):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.address = (host, Pixel_Protocols.ddp_port)
+        self.buffer = bytearray(Pixel_Protocols.ddp_header.size + Pixel_Protocols.ddp_max_data)
+        self.data = numpy.frombuffer(self.buffer, dtype=numpy.uint8)[Pixel_Protocols.ddp_header.size:]
+        self.sequence = 0
+        self.packets = 0
+    
+    def send(self, pixels):
+        data = pixels.reshape(-1)
+        for offset in range(0, len(data), Pixel_Protocols.ddp_max_data):
+            length = min(Pixel_Protocols.ddp_max_data, len(data) - offset)
+            self.data[:length] = data[offset:offset + length]
+            # Sequence numbers go from 1 to 15, 0 means unnumbered
+            self.sequence = self.sequence % 15 + 1
+            size = Pixel_Protocols.build_ddp(self.buffer, self.sequence, offset, length, offset + length == len(data))
+            self.socket.sendto(memoryview(self.buffer)[:size], self.address)
+            self.packets += 1
+
+# Sends frames as one E1.31 packet per universe of 128 RGBW pixels
+class E131_Sender():
+    # Constructor
+    def __init__(self, host, n):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.address = (host, Pixel_Protocols.e131_port)
+        self.buffer = bytearray(Pixel_Protocols.e131_header_size + Pixel_Protocols.e131_universe_size)
+        Pixel_Protocols.build_e131_header(self.buffer, uuid.uuid4().bytes, b"window stream sender")
+        self.data = numpy.frombuffer(self.buffer, dtype=numpy.uint8)[Pixel_Protocols.e131_header_size:]
+        self.sequence = 0
+        self.packets = 0
+    
+    def send(self, pixels):
+        data = pixels.reshape(-1)
+        for index, offset in enumerate(range(0, len(data), Pixel_Protocols.e131_universe_size)):
+            channels = min(Pixel_Protocols.e131_universe_size, len(data) - offset)
+            self.data[:channels] = data[offset:offset + channels]
+            size = Pixel_Protocols.build_e131(self.buffer, universe + index, self.sequence, channels)
+            self.socket.sendto(memoryview(self.buffer)[:size], self.address)
+            self.packets += 1
+        self.sequence = (self.sequence + 1) & 0xff
+
+
+if __name__ == "__main__":
+    main()
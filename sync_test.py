@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+# Runs a leader and several followers in lockstep as separate processes on this host, and measures
+# how far apart they switch frames. Each follower's clock is set off by a random amount first, so
+# they only line up if the clock exchange works
+# Usage: python3 sync_test.py [mode] [followers] [seconds] [pixels]
+
+from Frame_Buffer import Frame
+from Frame_Clock import Frame_Clock
+from Frame_Sync import Sync_Clock
+import Frame_Cache
+import Modes
+import multiprocessing
+import random
+import sys
+import time
+from threading import Event
+
+default_mode = "strobe"
+default_followers = 3
+default_seconds = 10
+default_pixels = 30
+settle_time = 3 # seconds to give the followers to sync before measuring
+max_skew = 100 # most seconds a follower's clock starts out off by
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else default_mode
+    followers = int(sys.argv[2]) if len(sys.argv) > 2 else default_followers
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else default_seconds
+    n = int(sys.argv[4]) if len(sys.argv) > 4 else default_pixels
+    mode_class = Modes.get_class(name)
+    if mode_class is None or not mode_class.cacheable:
+        print("Mode must be one of " + ", ".join(name for name, mode_class in Modes.class_dict.items() if mode_class.cacheable))
+        return
+    
+    # Record the mode once up front so every unit plays the same recording from the start
+    frame = Frame(n)
+    for delay in Frame_Cache.Cached_Mode(mode_class([])).cycle(frame):
+        pass
+    
+    # Run the units, each reporting the time it switched to every frame it showed
+    start = time.monotonic() + settle_time
+    stop = start + seconds
+    results = multiprocessing.Queue()
+    units = [multiprocessing.Process(target=run_unit, args=(name, n, index, start, stop, results)) for index in range(followers + 1)]
+    for unit in units:
+        unit.start()
+    switches = dict(results.get() for unit in units)
+    for unit in units:
+        unit.join()
+    
+    # Compare when each follower switched to each frame with when the leader did
+    leader = switches[0]
+    for index in range(1, followers + 1):
+        differences = sorted(abs(switched - leader[frame]) for frame, switched in switches[index].items() if frame in leader)
+        if len(differences) == 0:
+            print("Follower {} never showed the same frames as the leader".format(index))
+            continue
+        print("Follower {}: {} frames, median {:.2f} ms, worst {:.2f} ms apart from the leader".format(
+            index, len(differences), differences[len(differences) // 2] * 1000, differences[-1] * 1000))
+
+# Runs one unit, the leader if index is 0. Plays the mode by the shared clock and puts the real
+# time it switched to each frame on results, keyed by the frame's place in shared time
+def run_unit(name, n, index, start, stop, results):
+    stop_event = Event()
+    skew = 0 if index == 0 else random.uniform(-max_skew, max_skew)
+    sync_clock = Sync_Clock(stop_event, None if index == 0 else "127.0.0.1", local_clock=lambda: time.monotonic() + skew)
+    mode = Frame_Cache.Cached_Mode(Modes.get_class(name)([]), sync_clock)
+    frame = Frame(n)
+    clock = Frame_Clock()
+    switches = {}
+    shown = None
+    while time.monotonic() < stop:
+        for delay in mode.cycle(frame):
+            # Record when the frame changes, by which repeat of the recording and which frame it is
+            now = time.monotonic()
+            if now >= start and (shown is None or (frame.pixels != shown).any()):
+                period = mode.recording.period
+                repeat = int(sync_clock.now() // period)
+                position = int(Frame_Cache.numpy.searchsorted(mode.recording.ends, sync_clock.now() % period, side="right"))
+                switches[(repeat, position)] = now
+            shown = frame.pixels.copy()
+            clock.wait(delay)
+    stop_event.set()
+    results.put((index, switches))
+
+
+if __name__ == "__main__":
+    main()
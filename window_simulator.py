@@ -1,7 +1,8 @@
 #!/usr/bin/python3
 
 from TCP_Server import TCP_Server
-from LED_Strip import LED_Strip
+from LED_Strip import LED_Strip, Command_Queue
+from Render_Process import Render_Process
 from Remote_Receiver import Remote_Receiver
 from Button import Button
 from Alarm_Clock import Alarm_Clock
@@ -25,7 +26,7 @@ def main():
         pi = pigpio.pi()
         stop_event = Event()
         to_tcp_server = queue.Queue()
-        to_led_strip = queue.Queue()
+        to_led_strip = Command_Queue(push=not LED_Strip.render_process)
         to_alarm_clock = queue.Queue()
         to_th_sensor = queue.Queue()
         
@@ -39,7 +40,10 @@ def main():
         tcp_server = TCP_Server(stop_event, to_tcp_server, to_led_strip, to_alarm_clock, to_th_sensor)
         threads.append(tcp_server)
         
-        led_strip = LED_Strip(stop_event, to_tcp_server, to_led_strip)
+        if LED_Strip.render_process:
+            led_strip = Render_Process(stop_event, to_tcp_server, to_led_strip)
+        else:
+            led_strip = LED_Strip(stop_event, to_tcp_server, to_led_strip)
         threads.append(led_strip)
         
         remote_receiver = Remote_Receiver(pi, stop_event, to_led_strip)